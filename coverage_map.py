@@ -0,0 +1,43 @@
+from coverage_set import KeyIds
+
+# Line-oriented map of the elements covered by each input of an input file. Every element is written once:
+#   e<TAB><element id><TAB><element>
+#   i<TAB><input line, from 0><TAB><space separated element ids>
+ELEMENT = "e"
+INPUT = "i"
+
+
+def write_coverage_map(filename, input_coverage):
+    """Write `input_coverage`, the elements covered by each input in file order"""
+    key_ids = KeyIds()
+
+    with open(filename, 'w') as f:
+        for (line, keys) in enumerate(input_coverage):
+            ids = []
+            for key in keys:
+                known = len(key_ids)
+                key_id = key_ids.id(key)
+                if key_id == known:
+                    f.write("%s\t%d\t%s\n" % (ELEMENT, key_id, key))
+                ids.append(str(key_id))
+
+            f.write("%s\t%d\t%s\n" % (INPUT, line, " ".join(ids)))
+
+
+def read_coverage_map(filename):
+    """Elements covered by each input, in file order"""
+    elements = {}
+    input_coverage = []
+
+    with open(filename) as f:
+        for row in f:
+            kind, number, value = row.rstrip("\n").split("\t", 2)
+            if kind == ELEMENT:
+                elements[int(number)] = value
+            elif kind == INPUT:
+                line = int(number)
+                while len(input_coverage) <= line:
+                    input_coverage.append([])
+                input_coverage[line] = [elements[int(key_id)] for key_id in value.split()]
+
+    return input_coverage
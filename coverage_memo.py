@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+DEFAULT_MEMO_SIZE = 10000
+
+
+class CoverageMemo:
+    """Bounded LRU memo for values which depend on the current coverage.
+
+    Every entry is tagged with the coverage version it was computed for. `invalidate` starts a new version
+    whenever coverage grows; entries of older versions are not discarded but passed through `refresh` on their
+    next access, which is much cheaper than recomputing them when coverage only removes elements from them.
+    """
+
+    def __init__(self, max_size=DEFAULT_MEMO_SIZE):
+        self.max_size = max_size
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "hits=%d misses=%d refreshes=%d evictions=%d size=%d" % (
+            self.hits, self.misses, self.refreshes, self.evictions, len(self._entries))
+
+    def invalidate(self):
+        self.version += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.invalidate()
+
+    def lookup(self, key, refresh):
+        """Return the up-to-date value stored for `key`, or None if there is none"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        self._entries.move_to_end(key)
+        version, value = entry
+
+        if version == self.version:
+            self.hits += 1
+        else:
+            self.refreshes += 1
+            value = refresh(value)
+            self._entries[key] = (self.version, value)
+
+        return value
+
+    def get(self, key, compute, refresh):
+        """Return the value of `key`, calling `compute()` on a miss"""
+        value = self.lookup(key, refresh)
+
+        if value is None:
+            self.misses += 1
+            value = compute()
+            self._entries[key] = (self.version, value)
+
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return value
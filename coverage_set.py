@@ -0,0 +1,112 @@
+from collections.abc import Set
+
+if hasattr(int, "bit_count"):
+    def bit_count(mask):
+        return mask.bit_count()
+else:
+    def bit_count(mask):
+        return bin(mask).count("1")
+
+
+def bit_ids(mask):
+    """Iterate over the positions of the bits set in `mask`, lowest first"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+class KeyIds:
+    """Map coverage keys to dense integer IDs, so that a set of keys can be stored as a bitmask (Python int).
+    Union, difference and counting then become word-level operations on the mask."""
+
+    def __init__(self, keys=()):
+        self.ids = {}
+        self.keys = []
+
+        for key in keys:
+            self.id(key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def id(self, key):
+        """Return the ID of `key`, assigning the next free one if it was never seen"""
+        key_id = self.ids.get(key)
+
+        if key_id is None:
+            key_id = len(self.keys)
+            self.ids[key] = key_id
+            self.keys.append(key)
+
+        return key_id
+
+    def mask(self, keys):
+        """Convert an iterable of keys into a bitmask"""
+        mask = 0
+        for key in keys:
+            mask |= 1 << self.id(key)
+
+        return mask
+
+    def contains(self, mask, key):
+        key_id = self.ids.get(key)
+        return key_id is not None and (mask >> key_id) & 1 == 1
+
+    def keys_of(self, mask):
+        """Convert a bitmask back into the list of its keys"""
+        return [self.keys[key_id] for key_id in bit_ids(mask)]
+
+
+class CoverageSet(Set):
+    """Read-only set of keys backed by a bitmask. The mask is immutable, so the view is a snapshot."""
+
+    __slots__ = ("key_ids", "mask", "_len")
+
+    def __init__(self, key_ids, mask):
+        self.key_ids = key_ids
+        self.mask = mask
+        self._len = None
+
+    @classmethod
+    def _from_iterable(cls, it):
+        # Results of set operations with other iterables are plain sets
+        return set(it)
+
+    def __contains__(self, key):
+        return self.key_ids.contains(self.mask, key)
+
+    def __iter__(self):
+        return iter(self.key_ids.keys_of(self.mask))
+
+    def __len__(self):
+        if self._len is None:
+            self._len = bit_count(self.mask)
+
+        return self._len
+
+    def __sub__(self, other):
+        if isinstance(other, CoverageSet) and other.key_ids is self.key_ids:
+            return CoverageSet(self.key_ids, self.mask & ~other.mask)
+
+        return super().__sub__(other)
+
+    def __or__(self, other):
+        if isinstance(other, CoverageSet) and other.key_ids is self.key_ids:
+            return CoverageSet(self.key_ids, self.mask | other.mask)
+
+        return super().__or__(other)
+
+    def __and__(self, other):
+        if isinstance(other, CoverageSet) and other.key_ids is self.key_ids:
+            return CoverageSet(self.key_ids, self.mask & other.mask)
+
+        return super().__and__(other)
+
+    def __eq__(self, other):
+        if isinstance(other, CoverageSet) and other.key_ids is self.key_ids:
+            return self.mask == other.mask
+
+        return super().__eq__(other)
+
+    __hash__ = Set._hash
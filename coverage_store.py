@@ -0,0 +1,157 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from coverage_set import KeyIds
+from run_coverage import RunCoverage
+
+# Increase when the layout of the store changes, stores of another version are not read
+STORE_VERSION = 1
+
+MANIFEST = "manifest.json"
+RUNS_DIR = "runs"
+COVERAGE_DIR = "coverage"
+
+
+def _save_array(filename, array):
+    # Write to a temporary file first, readers never map a partial array
+    tmp_filename = "%s.%d.tmp.npy" % (filename, os.getpid())
+    np.save(tmp_filename, array, allow_pickle=False)
+    os.replace(tmp_filename, filename)
+
+
+def _save_json(filename, content):
+    tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+    with open(tmp_filename, 'w') as f:
+        json.dump(content, f, indent=1)
+    os.replace(tmp_filename, filename)
+
+
+def _column_array(column):
+    """Column of a table as an array that can be memory-mapped: numbers keep their type, text becomes fixed-width"""
+    if not pd.api.types.is_numeric_dtype(column.dtype):
+        return np.array(column.to_numpy(), dtype=str)
+
+    return column.to_numpy()
+
+
+class CoverageStore:
+    """Binary store of an experiment tree, converted once so analyses do not parse text files again.
+
+    The store directory holds the run table of the apps as one .npy file per column and, per app, the coverage of
+    its runs as a matrix of packed bitmaps (see RunCoverage). Arrays are memory-mapped when read, so only the
+    columns and apps an analysis uses are loaded, and only the pages it touches. The manifest, written last, lists
+    the apps and their number of statements.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self._manifest = None
+
+    def _path(self, *parts):
+        return os.path.join(self.store_dir, *parts)
+
+    def _app_dir(self, app):
+        return self._path(COVERAGE_DIR, app)
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            try:
+                with open(self._path(MANIFEST)) as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                raise Exception("No coverage store in %s" % self.store_dir)
+
+            if manifest.get("version") != STORE_VERSION:
+                raise Exception("Coverage store %s has version %s, expected %d" % (self.store_dir,
+                                                                                   manifest.get("version"),
+                                                                                   STORE_VERSION))
+            self._manifest = manifest
+
+        return self._manifest
+
+    def write_runs(self, rq, apps, coverage_gts, runs):
+        """Store the run table `runs` of `apps`, whose runs are those of research question `rq`"""
+        # Without a manifest the store is not read while its columns are replaced
+        if os.path.exists(self._path(MANIFEST)):
+            os.remove(self._path(MANIFEST))
+        self._manifest = None
+
+        os.makedirs(self._path(RUNS_DIR), exist_ok=True)
+        for column in runs.columns:
+            _save_array(self._path(RUNS_DIR, "%s.npy" % column), _column_array(runs[column]))
+
+        _save_json(self._path(MANIFEST), {
+            "version": STORE_VERSION,
+            "rq": rq,
+            "apps": list(apps),
+            "statements": [int(coverage_gt) for coverage_gt in coverage_gts],
+            "columns": list(runs.columns),
+        })
+
+    def apps(self):
+        return self.manifest["apps"]
+
+    def statements(self):
+        """Number of statements of each app, in the order of `apps`"""
+        return self.manifest["statements"]
+
+    def column(self, name):
+        """A column of the run table, memory-mapped"""
+        return np.load(self._path(RUNS_DIR, "%s.npy" % name), mmap_mode="r")
+
+    def read_runs(self, columns=None):
+        """Run table with the given columns, by default all of them"""
+        if columns is None:
+            columns = self.manifest["columns"]
+
+        return pd.DataFrame({column: self.column(column) for column in columns}, columns=columns)
+
+    def write_coverage(self, app, coverage):
+        """Store the RunCoverage of the runs of `app`"""
+        app_dir = self._app_dir(app)
+        os.makedirs(app_dir, exist_ok=True)
+
+        tmp_filename = os.path.join(app_dir, "statements.txt.%d.tmp" % os.getpid())
+        with open(tmp_filename, 'w') as f:
+            for statement in coverage.statements.keys:
+                f.write("%s\n" % statement)
+        os.replace(tmp_filename, os.path.join(app_dir, "statements.txt"))
+
+        _save_array(os.path.join(app_dir, "bitmaps.npy"), np.ascontiguousarray(coverage.bitmaps))
+        # The run names mark a complete entry
+        _save_json(os.path.join(app_dir, "runs.json"), {"version": STORE_VERSION,
+                                                        "names": list(coverage.names),
+                                                        "universe_size": coverage.universe_size})
+
+    def coverage_apps(self):
+        """Apps whose run coverage is stored"""
+        coverage_dir = self._path(COVERAGE_DIR)
+        if not os.path.isdir(coverage_dir):
+            return []
+
+        return sorted(app for app in os.listdir(coverage_dir)
+                      if os.path.exists(os.path.join(coverage_dir, app, "runs.json")))
+
+    def read_coverage(self, app):
+        """RunCoverage of the runs of `app`, with its bitmaps memory-mapped"""
+        app_dir = self._app_dir(app)
+        try:
+            with open(os.path.join(app_dir, "runs.json")) as f:
+                runs = json.load(f)
+        except FileNotFoundError:
+            raise Exception("No coverage of %s in the coverage store %s" % (app, self.store_dir))
+
+        if runs.get("version") != STORE_VERSION:
+            raise Exception("Coverage of %s in %s has version %s, expected %d" % (app, self.store_dir,
+                                                                                 runs.get("version"), STORE_VERSION))
+
+        with open(os.path.join(app_dir, "statements.txt")) as f:
+            statements = KeyIds(f.read().splitlines())
+
+        bitmaps = np.load(os.path.join(app_dir, "bitmaps.npy"), mmap_mode="r")
+
+        return RunCoverage(statements, runs["names"], bitmaps, runs["universe_size"])
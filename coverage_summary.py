@@ -0,0 +1,92 @@
+import argparse
+import os
+import re
+
+from coverage_set import KeyIds
+from run_coverage import RunCoverage, read_run, read_universe
+
+GRAMMAR_COVERAGE = "grammarCoverage.txt"
+CODE_COVERAGE = "codeCoverage.txt"
+
+
+def seed_dirs(seeds_dir):
+    """seed* directories of `seeds_dir`, ordered by seed number"""
+    dirs = [o for o in os.listdir(seeds_dir) if os.path.isdir(os.path.join(seeds_dir, o)) and o.startswith("seed")]
+
+    def seed_number(name):
+        number = re.search(r"\d+", name)
+        return (int(number.group()) if number else -1, name)
+
+    return [os.path.join(seeds_dir, o) for o in sorted(dirs, key=seed_number)]
+
+
+def read_result_summary(filename):
+    """Coverage and number of reached and missed elements of a file written by Result.save.
+
+    Only the header lines before the first empty line are read, never the lists of reached and missed elements.
+    """
+    values = {}
+    with open(filename) as f:
+        for line in f:
+            if not line.strip():
+                break
+            (name, _, value) = line.partition(":")
+            values[name.strip()] = value.strip()
+
+    return "Coverage %s\tReached %s\tMissed %s" % (values.get("Coverage"), values.get("NrReached"),
+                                                   values.get("NrMissed"))
+
+
+def print_result_summaries(dirs, result_file):
+    for d in dirs:
+        filename = os.path.join(d, result_file)
+        if os.path.exists(filename):
+            print("%s\t%s" % (os.path.basename(d), read_result_summary(filename)))
+        else:
+            print("%s\tmissing %s" % (os.path.basename(d), result_file))
+
+
+def print_statement_summaries(dirs, package, apk_json=None):
+    """Statements reached by each seed, from the model/<package>/coverage.txt of its directory. The files are
+    streamed one at a time and only a bitmap per seed is kept."""
+    statements = read_universe(apk_json) if apk_json is not None else KeyIds()
+    universe_size = len(statements)
+
+    names = []
+    runs = []
+    for d in dirs:
+        filename = os.path.join(d, "model", package, "coverage.txt")
+        if os.path.exists(filename):
+            names.append(os.path.basename(d))
+            runs.append(read_run(statements, filename))
+
+    coverage = RunCoverage.from_bitmaps(statements, names, runs, universe_size)
+    for (name, covered, exclusive) in zip(coverage.names, coverage.covered(), coverage.exclusive()):
+        print("%s\tReached %d\tExclusive %d" % (name, covered, exclusive))
+
+    total = coverage.union_count()
+    if universe_size:
+        print("Total\tReached %d\tOf %d\t(%.4f)" % (total, universe_size, total / universe_size))
+    else:
+        print("Total\tReached %d" % total)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the grammar and code coverage of every seed directory")
+    parser.add_argument("seeds_dir", nargs="?", default=".", help="directory with the seed* directories (default: .)")
+    parser.add_argument("--package", default=None,
+                        help="also summarize the statements in model/<package>/coverage.txt of each seed")
+    parser.add_argument("--apk-json", default=None,
+                        help="instrumentation file of the app, to report the statements reached out of all")
+    args = parser.parse_args()
+
+    dirs = seed_dirs(args.seeds_dir)
+
+    print("Grammar")
+    print_result_summaries(dirs, GRAMMAR_COVERAGE)
+    print("Code")
+    print_result_summaries(dirs, CODE_COVERAGE)
+
+    if args.package is not None:
+        print("Statements")
+        print_statement_summaries(dirs, args.package, args.apk_json)
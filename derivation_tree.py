@@ -0,0 +1,191 @@
+from collections import deque
+
+
+def iterative_all_terminals(tree):
+    """Concatenate the terminal (and unexpanded) symbols of `tree`, visiting the nodes level by level"""
+    if tree is None or len(tree) < 2:
+        return ''
+
+    (symbol, children) = tree
+
+    if children is None or len(children) == 0:
+        # This is a nonterminal symbol not expanded yet
+        # Or This is a terminal symbol
+        return symbol
+
+    # This is an expanded symbol:
+    # Concatenate all terminal symbols from all children
+    terminals = []
+    queue = deque(children)
+
+    while queue:
+        (new_symbol, new_children) = queue.popleft()
+
+        if new_children is None or len(new_children) == 0:
+            terminals.append(new_symbol)
+        else:
+            queue.extend(new_children)
+
+    return ''.join(terminals)
+
+
+def all_non_terminals(tree):
+    """Concatenate the expanded symbols of `tree` in pre-order, each one followed by a space"""
+    symbols = []
+    stack = [tree]
+
+    while stack:
+        (symbol, children) = stack.pop()
+
+        # Unexpanded nonterminals and terminals are skipped
+        if children:
+            symbols.append(symbol)
+            symbols.append(" ")
+            stack.extend(reversed(children))
+
+    return ''.join(symbols)
+
+
+def expanded_nodes(tree):
+    """Iterate over the nodes of `tree` which were expanded into at least one child"""
+    stack = [tree]
+
+    while stack:
+        node = stack.pop()
+        children = node[1]
+        if children:
+            yield node
+            stack.extend(children)
+
+
+def possible_expansions(tree):
+    """Number of nonterminals in `tree` which were not expanded yet"""
+    total = 0
+    stack = [tree]
+
+    while stack:
+        (symbol, children) = stack.pop()
+        if children is None:
+            total += 1
+        else:
+            stack.extend(children)
+
+    return total
+
+
+def any_possible_expansions(tree):
+    """Whether `tree` still has nonterminals to expand"""
+    stack = [tree]
+
+    while stack:
+        (symbol, children) = stack.pop()
+        if children is None:
+            return True
+
+        stack.extend(children)
+
+    return False
+
+
+class TerminalsCache:
+    """Remember the terminal string of complete derivation trees.
+
+    Trees are expanded in place, so only trees without unexpanded nonterminals are cached. Entries keep a reference
+    to their tree, an identity check guards against a new tree reusing the id of a discarded one.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def clear(self):
+        self._entries.clear()
+
+    def all_terminals(self, tree):
+        entry = self._entries.get(id(tree))
+        if entry is not None and entry[0] is tree:
+            return entry[1]
+
+        value = iterative_all_terminals(tree)
+        if tree is not None and len(tree) >= 2 and not any_possible_expansions(tree):
+            self._entries[id(tree)] = (tree, value)
+
+        return value
+
+
+class Frontier:
+    """Open nonterminal nodes of a derivation tree which is expanded in place.
+
+    Every expanded node keeps the number of open nonterminals below it, keyed by its children list. Expanding picks
+    the node like fuzzingbook's `expand_tree_once`, one expandable child per level, but reads the counts instead of
+    searching each subtree for open nodes; afterwards only the new node and the counts on its path are updated.
+    `size` is the number of nodes of the tree.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.size = 0
+        self._open = {}
+        self._count(tree)
+
+    def __len__(self):
+        return self.open_count(self.tree)
+
+    def open_count(self, node):
+        """Number of nonterminals of the subtree `node` which were not expanded yet"""
+        children = node[1]
+        if children is None:
+            return 1
+        if not children:
+            return 0
+
+        return self._open[id(children)][1]
+
+    def _count(self, node):
+        """Count the nodes and open nonterminals of `node`, a subtree which is new to the frontier"""
+        stack = [(node, False)]
+
+        while stack:
+            (current, counted) = stack.pop()
+            children = current[1]
+            if counted:
+                # The entry keeps the list alive, so its id is not reused by another one
+                self._open[id(children)] = [children, sum(self.open_count(child) for child in children)]
+            else:
+                self.size += 1
+                if children:
+                    stack.append((current, True))
+                    stack.extend((child, False) for child in children)
+
+        return self.open_count(node)
+
+    def expand(self, choose, expand_node):
+        """Replace an open node by `expand_node(node)` and return the (possibly new) root.
+
+        The node is found by descending from the root: `choose(node, expandable_children)` returns the index of the
+        child to descend into among the children of `node` which still have open nodes.
+        """
+        path = []
+        node = self.tree
+
+        while node[1] is not None:
+            children = node[1]
+            expandable = [i for (i, child) in enumerate(children) if self.open_count(child) > 0]
+            position = expandable[choose(node, [children[i] for i in expandable])]
+            path.append((children, position))
+            node = children[position]
+
+        new_node = expand_node(node)
+        # The node is counted again with its new children
+        self.size -= 1
+        added = self._count(new_node) - 1
+
+        if path:
+            (children, position) = path[-1]
+            children[position] = new_node
+        else:
+            self.tree = new_node
+
+        for (children, _) in path:
+            self._open[id(children)][1] += added
+
+        return self.tree
@@ -0,0 +1,62 @@
+import subprocess
+import time
+
+DEFAULT_BOOT_TIMEOUT = 300
+INITIAL_POLL_DELAY = 1.0
+MAX_POLL_DELAY = 10.0
+ADB_TIMEOUT = 10
+
+
+class EmulatorNotReady(Exception):
+    pass
+
+
+def boot_completed(emulator_name):
+    """Whether the emulator reports that Android finished booting. False while adb does not see it yet."""
+    try:
+        result = subprocess.run(["adb", "-s", emulator_name, "shell", "getprop", "sys.boot_completed"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=ADB_TIMEOUT)
+    except (subprocess.TimeoutExpired, OSError):
+        return False
+
+    return result.returncode == 0 and result.stdout.strip() == b"1"
+
+
+class EmulatorReadiness:
+    """Handle of a starting emulator, to wait until it has booted instead of sleeping a fixed time.
+
+    The boot state is polled through adb immediately, then with a delay starting at `initial_delay` seconds and
+    doubling up to `max_delay`. The handle only keeps the emulator name and deadline, so it can be passed to worker
+    processes.
+    """
+
+    def __init__(self, emulator_name, timeout=DEFAULT_BOOT_TIMEOUT, initial_delay=INITIAL_POLL_DELAY,
+                 max_delay=MAX_POLL_DELAY, probe=boot_completed):
+        self.emulator_name = emulator_name
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.probe = probe
+        self.started = time.monotonic()
+        self.ready = False
+
+    def is_ready(self):
+        if not self.ready:
+            self.ready = self.probe(self.emulator_name)
+
+        return self.ready
+
+    def wait(self):
+        """Block until the emulator has booted. Raise EmulatorNotReady if it did not boot within the timeout."""
+        delay = self.initial_delay
+
+        while not self.is_ready():
+            remaining = self.started + self.timeout - time.monotonic()
+            if remaining <= 0:
+                raise EmulatorNotReady("Emulator %s did not boot within %s seconds" % (self.emulator_name,
+                                                                                      self.timeout))
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.max_delay)
+
+        print("Emulator %s ready after %.1f seconds" % (self.emulator_name, time.monotonic() - self.started))
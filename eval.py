@@ -1,7 +1,15 @@
+import argparse
 import csv
-import math
+import multiprocessing
 import os
-import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from coverage_store import CoverageStore
+from run_cache import RunCache, file_stamps
+from statement_index import StatementIndex
 
 ABS_COVERAGE = "abs_coverage"
 
@@ -9,155 +17,296 @@ STD_DEV_THRESHOLD = 2
 GRAMMAR_COVERAGE_THRESHOLD = 0.2
 CODE_COVERAGE_THRESHOLD = 0.4
 
+MAX_RUNS = 10
 
-def has_crashed(value):
-    return value["GrammarReached"] == "0" or value["CodeReached"] == "0"
+# Number of statements of each APK, so the instrumentation files are only read when they change
+STATEMENT_INDEX_FILE = "./cache/statements.json"
+# Runs read from the summary files of each app, so only apps with new or changed results are read again
+RUN_CACHE_DIR = "./cache/runs"
 
+SUMMARY_HEADER = ("App", "#Working", "#Fail", "Grammar Size", "Avg. Input Size", "St Dev Input Size",
+                  "Avg. Grammar Coverage", "St Dev Grammar Coverage", "Avg. Relative Code Coverage",
+                  "St Dev Relative Code Coverage", "Avg. Absolute Code Coverage",
+                  "St Dev Absolute Code Coverage", "#Stmts")
+APPS_HEADER = ("App", "Seed", "Input Size", "Grammar Coverage", "Relative Code Coverage",
+               "Absolute Code Coverage", "Run Path")
 
-def st_dev(values, mean):
-    res = 0
+# Typed columns of the run table, parsed from the summary file columns. The summary columns are kept as text
+# so apps.csv repeats them exactly as they were written.
+TYPED_COLUMNS = {
+    "input_size": ("Input Size", float),
+    "grammar_reached": ("GrammarReached", int),
+    "grammar_missed": ("GrammarMissed", int),
+    "grammar_cov": ("GrammarCov", float),
+    "code_reached": ("CodeReached", int),
+    "code_cov": ("CodeCov", float),
+}
+# Columns averaged for the summary, in the order of the summary
+METRIC_COLUMNS = ["input_size", "grammar_cov", "code_cov", ABS_COVERAGE]
+# Columns of the run table used by evaluate, the ones kept in a CoverageStore
+RUN_COLUMNS = ["group", "Seed", "path", "Input Size", "GrammarCov", "CodeCov", ABS_COVERAGE, *TYPED_COLUMNS]
 
-    for value in values:
-        res += math.pow(value - mean, 2)
 
-    return math.sqrt(res / max(len(values), 1))
+def read_summary(e_dir, summary_file, coverage_gt):
+    """Runs of a summary file as a table with the text columns of the file and their typed values"""
+    runs = pd.read_csv(os.path.join(e_dir, summary_file), sep='\t', dtype=str, keep_default_na=False,
+                       encoding="utf8")
 
+    # Newer summaries end with the totals of all seeds, which are not runs
+    runs = runs[runs["CodeReached"].str.fullmatch(r"\d+", na=False)].copy()
 
-def is_outlier(value, mean, dev, threshold):
-    if value < threshold:
-        return True
+    for (column, (source, dtype)) in TYPED_COLUMNS.items():
+        runs[column] = runs[source].astype(dtype)
 
-    min = mean - STD_DEV_THRESHOLD * dev
-    max = mean + STD_DEV_THRESHOLD * dev
-    if value < min or value > max:
-        return True
+    summary_run = summary_file.split("_")[-1].replace(".txt", "")
+    runs["Seed"] = summary_run + "_" + runs["Seed"].str.zfill(2)
+    # append seed dir
+    runs["path"] = [str(os.path.join(e_dir, "seed_" + seed)) for seed in runs["Seed"]]
+    # append absolute coverage
+    runs[ABS_COVERAGE] = runs["code_reached"] / coverage_gt
+
+    return runs
+
+
+def summary_files(e_dir):
+    return [summary_file for summary_file in os.listdir(e_dir)
+            if summary_file.startswith("summary") and summary_file.endswith(".txt")]
 
-    return False
 
+def read_runs(e_dir, coverage_gt, files=None):
+    """Runs of the summary `files` (by default all summary files) in `e_dir` as one table"""
+    if files is None:
+        files = summary_files(e_dir)
+    tables = [read_summary(e_dir, summary_file, coverage_gt) for summary_file in files]
 
-def csv_dict_list(file, coverage_gt, summary_file):
-    dict_list = []
-    if not os.path.exists(os.path.join(file, summary_file)):
-        return dict_list
-    # Open variable-based csv, iterate over the rows and map values to a list of dictionaries containing key/value pairs
-    reader = csv.DictReader(open(os.path.join(file, summary_file), 'rt', encoding="utf8"), delimiter='\t')
-    # dict_list = []
-    for line in reader:
-        summary_run = summary_file.split("_")[-1].replace(".txt", "")
-        seed = summary_run + "_" + line["Seed"].zfill(2)
-        line["Seed"] = seed
-        # append seed dir
-        line["path"] = str(os.path.join(file, "seed_" + seed))
-        # append absolute coverage
-        line[ABS_COVERAGE] = int(line["CodeReached"]) / coverage_gt
-        dict_list.append(line)
-    return dict_list
+    if not tables:
+        return None
 
+    return pd.concat(tables, ignore_index=True)
 
-def compute_metrics(values):
-    grammar_cov = 0
-    relative_code_cov = 0
-    abs_code_cov = 0
-    grammar_size = 0
-    input_size = 0
 
-    for value in values:
-        # ignore crashed for average
-        grammar_cov += float(value["GrammarCov"])
-        relative_code_cov += float(value["CodeCov"])
-        abs_code_cov += float(value[ABS_COVERAGE])
-        input_size += float(value["Input Size"])
-        if grammar_size == 0:
-            grammar_size = int(value["GrammarReached"]) + int(value["GrammarMissed"])
+def group_sums(codes, values, num_groups):
+    """Sum of `values` per group. Values are added in row order, as a plain loop over the rows would."""
+    return np.bincount(codes, weights=values, minlength=num_groups)
+
 
-    count = max(len(values), 1)
-    avg_grammar_cov = grammar_cov / count
-    avg_relative_code_cov = relative_code_cov / count
-    avg_abs_code_cov = abs_code_cov / count
-    avg_input_size = input_size / count
+def group_metrics(runs, num_groups):
+    """Number of runs, and the mean and standard deviation of each metric column per group. Groups without
+    runs count as a single run, with zero means and deviations."""
+    codes = runs["group"].to_numpy()
+    count = np.maximum(np.bincount(codes, minlength=num_groups), 1)
 
-    filt = lambda f: map(lambda x: float(x[f]), values)
+    means = {}
+    devs = {}
+    for column in METRIC_COLUMNS:
+        values = runs[column].to_numpy(dtype=float)
+        means[column] = group_sums(codes, values, num_groups) / count
+        squares = np.power(values - means[column][codes], 2)
+        devs[column] = np.sqrt(group_sums(codes, squares, num_groups) / count)
+
+    return count, means, devs
 
-    grammar_cov_values = list(filt("GrammarCov"))
-    grammar_std_dev = st_dev(grammar_cov_values,
-                             avg_grammar_cov)
 
-    relative_code_coverage_values = list(filt("CodeCov"))
-    relative_code_cov_std_dev = st_dev(relative_code_coverage_values,
-                                       avg_relative_code_cov)
+def is_outlier(values, mean, dev, threshold):
+    return (values < threshold) | (values < mean - STD_DEV_THRESHOLD * dev) | (values > mean + STD_DEV_THRESHOLD * dev)
 
-    abs_code_coverage_values = list(filt(ABS_COVERAGE))
-    abs_code_coverage_std_dev = st_dev(abs_code_coverage_values, avg_abs_code_cov)
 
-    input_size_values = list(filt("Input Size"))
-    input_size_std_dev = st_dev(input_size_values, avg_input_size)
+def filter_bad_values(runs, num_groups):
+    """Runs which did not crash and are no outliers of their group, at most MAX_RUNS per group"""
+    runs = runs[(runs["grammar_reached"] != 0) & (runs["code_reached"] != 0)]
 
-    return count, 10 - count, grammar_size, avg_input_size, input_size_std_dev, avg_grammar_cov, grammar_std_dev, avg_relative_code_cov, relative_code_cov_std_dev, avg_abs_code_cov, abs_code_coverage_std_dev
+    _, means, devs = group_metrics(runs, num_groups)
+    codes = runs["group"].to_numpy()
+    outliers = (is_outlier(runs["grammar_cov"].to_numpy(), means["grammar_cov"][codes], devs["grammar_cov"][codes],
+                           GRAMMAR_COVERAGE_THRESHOLD) |
+                is_outlier(runs["code_cov"].to_numpy(), means["code_cov"][codes], devs["code_cov"][codes],
+                           CODE_COVERAGE_THRESHOLD))
+    runs = runs[~outliers]
 
+    return runs[runs.groupby("group", sort=False).cumcount() < MAX_RUNS]
 
-def filter_bad_values(values):
-    _, _, _, _, _, avg_grammar_cov, grammar_std_dev, avg_relative_code_cov, relative_code_cov_std_dev, _, _ = compute_metrics(
-        values)
 
-    filt = lambda v: not is_outlier(float(v["GrammarCov"]), avg_grammar_cov, grammar_std_dev,
-                                    GRAMMAR_COVERAGE_THRESHOLD) and not is_outlier(float(v["CodeCov"]),
-                                                                                   avg_relative_code_cov,
-                                                                                   relative_code_cov_std_dev,
-                                                                                   CODE_COVERAGE_THRESHOLD)
-    return list(filter(filt, values))[:10]
+def grammar_sizes(runs, num_groups):
+    """Grammar size of each group, taken from its first run with a non empty grammar"""
+    size = runs["grammar_reached"] + runs["grammar_missed"]
+    first = runs[size != 0].drop_duplicates("group")
 
+    sizes = np.zeros(num_groups, dtype=int)
+    sizes[first["group"].to_numpy()] = (first["grammar_reached"] + first["grammar_missed"]).to_numpy(dtype=int)
 
-if __name__ == "__main__":
+    return sizes
+
+
+def evaluate(runs, apps, coverage_gts):
+    """Summary and selected runs of `apps` from the table of all their runs. The `group` column of `runs` is the
+    position of the app of each run in `apps`."""
+    values = filter_bad_values(runs, len(apps))
+    count, means, devs = group_metrics(values, len(apps))
 
-    rq = "rq1"
-    e = os.path.abspath("/Volumes/Experiments/20-icse-regression-with-grammars/experiments")
-
-    with open('./summary_%s.csv' % rq, 'w', newline='') as summary_csv, open('./apps.csv', 'w', newline='') as app_csv:
-        summary_writer = csv.writer(summary_csv, delimiter='\t',
-                                    quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        summary_writer.writerow(
-            ("App", "#Working", "#Fail", "Grammar Size", "Avg. Input Size", "St Dev Input Size",
-             "Avg. Grammar Coverage", "St Dev Grammar Coverage", "Avg. Relative Code Coverage",
-             "St Dev Relative Code Coverage", "Avg. Absolute Code Coverage",
-             "St Dev Absolute Code Coverage", "#Stmts"))
-
-        app_writer = csv.writer(app_csv, delimiter='\t',
-                                quotechar='|', quoting=csv.QUOTE_MINIMAL)
-        app_writer.writerow(("App", "Seed", "Input Size", "Grammar Coverage", "Relative Code Coverage",
-                             "Absolute Code Coverage", "Run Path"))
-
-        for app in os.listdir(os.fsencode(e)):
-            filename = os.fsdecode(app)
-            e_dir = os.path.join(e, filename, rq)
-
-            if not os.path.isdir(e_dir):
-                continue
-
-            coverage_gt = 0
-
-            with open(os.path.join(e, filename, "apks", filename + ".apk.json"), 'rt') as coverage_gt_file:
-                # data = coverage_gt_file.read().decode("ASCII")
-                content = json.load(coverage_gt_file, encoding='utf-8')
-                # content = json.loads(data)
-                for entry in content["allMethods"]:
-                    coverage_gt += 1
-
-            run_data = []
-            for summary_file in os.listdir(e_dir):
-                if summary_file.startswith("summary") and summary_file.endswith(".txt"):
-                    run_data += csv_dict_list(e_dir, coverage_gt, summary_file)
-
-            values = list(
-                filter(lambda v: not has_crashed(v),
-                       run_data
-                       )
-            )
-
-            values = filter_bad_values(values)
-            summary_writer.writerow((filename, *compute_metrics(values), coverage_gt))
-
-            for value in values:
-                app_writer.writerow((
-                    filename, value["Seed"], value["Input Size"], value["GrammarCov"], value["CodeCov"], value[
-                        ABS_COVERAGE],
-                    value["path"]))
+    summary = pd.DataFrame({
+        "App": apps,
+        "#Working": count,
+        "#Fail": MAX_RUNS - count,
+        "Grammar Size": grammar_sizes(values, len(apps)),
+        "Avg. Input Size": means["input_size"],
+        "St Dev Input Size": devs["input_size"],
+        "Avg. Grammar Coverage": means["grammar_cov"],
+        "St Dev Grammar Coverage": devs["grammar_cov"],
+        "Avg. Relative Code Coverage": means["code_cov"],
+        "St Dev Relative Code Coverage": devs["code_cov"],
+        "Avg. Absolute Code Coverage": means[ABS_COVERAGE],
+        "St Dev Absolute Code Coverage": devs[ABS_COVERAGE],
+        "#Stmts": coverage_gts,
+    }, columns=SUMMARY_HEADER)
+
+    selected = pd.DataFrame({
+        "App": np.asarray(apps, dtype=object)[values["group"].to_numpy()],
+        "Seed": values["Seed"].to_numpy(),
+        "Input Size": values["Input Size"].to_numpy(),
+        "Grammar Coverage": values["GrammarCov"].to_numpy(),
+        "Relative Code Coverage": values["CodeCov"].to_numpy(),
+        "Absolute Code Coverage": values[ABS_COVERAGE].to_numpy(),
+        "Run Path": values["path"].to_numpy(),
+    }, columns=APPS_HEADER)
+
+    return summary, selected
+
+
+# Statement count, runs (None if there are no summary files) and statement index entries of an app, and whether
+# they were taken from the RunCache
+AppRuns = namedtuple("AppRuns", ["app", "coverage_gt", "runs", "statement_entries", "cached"])
+
+# Experiments root, research question, statement index and run cache shared by all apps loaded in a worker process
+_worker_e = None
+_worker_rq = None
+_worker_statements = None
+_worker_cache = None
+
+
+def _init_worker(e, rq, statements, cache):
+    global _worker_e, _worker_rq, _worker_statements, _worker_cache
+    _worker_e = e
+    _worker_rq = rq
+    _worker_statements = statements
+    _worker_cache = cache
+
+
+def _load_app(filename):
+    e_dir = os.path.join(_worker_e, filename, _worker_rq)
+    apk_json = os.path.join(_worker_e, filename, "apks", filename + ".apk.json")
+    files = summary_files(e_dir)
+
+    if _worker_cache is not None:
+        stamps = file_stamps([apk_json] + [os.path.join(e_dir, summary_file) for summary_file in files])
+        cached = _worker_cache.load(e_dir, stamps)
+        if cached is not None:
+            (coverage_gt, runs) = cached
+            return AppRuns(filename, coverage_gt, runs, {}, True)
+
+    coverage_gt = _worker_statements.count(apk_json)
+    runs = read_runs(e_dir, coverage_gt, files)
+
+    if _worker_cache is not None:
+        _worker_cache.store(e_dir, stamps, (coverage_gt, runs))
+
+    return AppRuns(filename, coverage_gt, runs, _worker_statements.entries_of(apk_json), False)
+
+
+def list_apps(e, rq):
+    """Apps of the experiments root `e` with results for `rq`, sorted by name"""
+    apps = [os.fsdecode(app) for app in os.listdir(os.fsencode(e))]
+    return sorted(app for app in apps if os.path.isdir(os.path.join(e, app, rq)))
+
+
+def load_experiments(e, rq, statements, jobs=1, cache=None):
+    """Apps with results for `rq`, their statement counts, looked up in the StatementIndex `statements`, and the
+    table of all their runs. The apps are loaded by `jobs` worker processes and merged in the order of their names,
+    so the result does not depend on the number of workers.
+
+    With a RunCache `cache`, only apps whose summary files or APK JSON changed since they were cached are read again.
+    """
+    apps = list_apps(e, rq)
+    coverage_gts = []
+    tables = []
+    num_cached = 0
+
+    init_args = (e, rq, statements, cache)
+    if jobs > 1:
+        pool = multiprocessing.Pool(processes=jobs, initializer=_init_worker, initargs=init_args)
+        # Hand out the apps in shards, a few per worker, instead of one at a time
+        results = pool.imap(_load_app, apps, chunksize=max(1, len(apps) // (jobs * 4)))
+    else:
+        pool = None
+        _init_worker(*init_args)
+        results = map(_load_app, apps)
+
+    try:
+        for (group, app_runs) in enumerate(results):
+            statements.update(app_runs.statement_entries)
+            num_cached += app_runs.cached
+            coverage_gts.append(app_runs.coverage_gt)
+            if app_runs.runs is not None:
+                app_runs.runs["group"] = group
+                tables.append(app_runs.runs)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if cache is not None:
+        print("Reused the cached runs of %d of %d apps" % (num_cached, len(apps)))
+
+    if tables:
+        runs = pd.concat(tables, ignore_index=True)
+    else:
+        runs = pd.DataFrame({column: [] for column in RUN_COLUMNS})
+    runs["group"] = runs["group"].astype(int)
+
+    return apps, coverage_gts, runs
+
+
+def write_table(filename, table):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t',
+                            quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(table.columns)
+        writer.writerows(table.itertuples(index=False, name=None))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the coverage reached by the experiment runs of each app")
+    parser.add_argument("experiments", nargs="?", help="experiments root, one directory per app")
+    parser.add_argument("--rq", default="rq1",
+                        help="research question, subdirectory of each app containing its runs (default: rq1)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of apps loaded in parallel (default: 1)")
+    parser.add_argument("--statement-index", default=STATEMENT_INDEX_FILE,
+                        help="file caching the number of statements of each APK (default: %s)" % STATEMENT_INDEX_FILE)
+    parser.add_argument("--cache-dir", default=RUN_CACHE_DIR,
+                        help="directory caching the runs of each app (default: %s)" % RUN_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="read the summary files of all apps again")
+    parser.add_argument("--store", default=None,
+                        help="read the runs from this coverage store (see ingest_coverage.py) instead of the "
+                             "experiments root")
+    args = parser.parse_args()
+
+    if (args.experiments is None) == (args.store is None):
+        parser.error("expected either the experiments root or --store")
+
+    if args.store is not None:
+        store = CoverageStore(args.store)
+        rq = store.manifest["rq"]
+        apps = store.apps()
+        coverage_gts = store.statements()
+        runs = store.read_runs(RUN_COLUMNS)
+    else:
+        rq = args.rq
+        e = os.path.abspath(args.experiments)
+
+        statements = StatementIndex(args.statement_index)
+        cache = None if args.no_cache else RunCache(args.cache_dir)
+        apps, coverage_gts, runs = load_experiments(e, rq, statements, args.jobs, cache)
+        statements.save()
+
+    summary, selected = evaluate(runs, apps, coverage_gts)
+
+    write_table('./summary_%s.csv' % rq, summary)
+    write_table('./apps.csv', selected)
@@ -0,0 +1,87 @@
+import copy
+import time
+from collections import namedtuple
+
+from coverage_set import bit_count
+
+
+class BudgetExhausted(Exception):
+    def __init__(self, reason):
+        super().__init__("%s budget exhausted" % reason)
+        self.reason = reason
+
+
+class GenerationBudget:
+    """Limits for generating a single input set: wall-clock seconds, number of inputs and number of nodes of the
+    derivation tree of each input. `None` disables a limit."""
+
+    def __init__(self, max_seconds=None, max_inputs=None, max_tree_size=None):
+        self.max_seconds = max_seconds
+        self.max_inputs = max_inputs
+        self.max_tree_size = max_tree_size
+        self.deadline = None
+
+    def __str__(self):
+        return "max_seconds=%s max_inputs=%s max_tree_size=%s" % (self.max_seconds, self.max_inputs,
+                                                                  self.max_tree_size)
+
+    def start(self):
+        """Return a copy of the budget whose time limit starts now"""
+        budget = copy.copy(self)
+        if self.max_seconds is not None:
+            budget.deadline = time.monotonic() + self.max_seconds
+
+        return budget
+
+    def check_tree(self, tree_size):
+        """Raise BudgetExhausted if the tree being expanded is too large or the time is up"""
+        if self.max_tree_size is not None and tree_size > self.max_tree_size:
+            raise BudgetExhausted("tree size")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExhausted("time")
+
+    def inputs_exhausted(self, num_inputs):
+        return self.max_inputs is not None and num_inputs >= self.max_inputs
+
+
+class CoverageReport(namedtuple("CoverageReport",
+                                 ["inputs", "covered", "target", "missing", "exhausted", "input_coverage"])):
+    """Outcome of generating an input set: number of inputs, covered and targeted elements, the elements which
+    were not covered, the budget which stopped the generation (None if it was not stopped by a budget) and the
+    elements covered by each input"""
+
+    __slots__ = ()
+
+    def __str__(self):
+        text = "%d inputs covering %d of %d elements (%.2f)" % (
+            self.inputs, self.covered, self.target, self.covered / self.target if self.target else 1.0)
+        if self.exhausted is not None:
+            text += ", stopped by the %s budget" % self.exhausted
+
+        return text
+
+
+def coverage_report(key_ids, target_mask, covered_mask, input_masks, exhausted=None):
+    return CoverageReport(len(input_masks),
+                          bit_count(target_mask & covered_mask),
+                          bit_count(target_mask),
+                          key_ids.keys_of(target_mask & ~covered_mask),
+                          exhausted,
+                          [key_ids.keys_of(mask) for mask in input_masks])
+
+
+def add_budget_arguments(parser):
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="stop generating an input set after this many seconds")
+    parser.add_argument("--max-inputs", type=int, default=None,
+                        help="stop generating an input set once it has this many inputs")
+    parser.add_argument("--max-tree-size", type=int, default=None,
+                        help="stop generating an input set when a derivation tree grows beyond this many nodes")
+
+
+def budget_from_arguments(args):
+    """GenerationBudget with the limits given on the command line, None if there are none"""
+    if args.max_seconds is None and args.max_inputs is None and args.max_tree_size is None:
+        return None
+
+    return GenerationBudget(args.max_seconds, args.max_inputs, args.max_tree_size)
@@ -0,0 +1,235 @@
+import heapq
+from collections import deque, namedtuple
+
+from fuzzingbook.Grammars import nonterminals
+
+from coverage_set import KeyIds, bit_ids
+
+EMPTY_SYMBOL = "<empty>"
+INFINITY = float('inf')
+
+# Expansion of a grammar rule parsed once: the coverage keys it produces (also as a bitmask of key IDs),
+# the nonterminals it references and whether it is the `<empty>` alternative of its symbol
+CompiledExpansion = namedtuple("CompiledExpansion",
+                               ["symbol", "expansion", "keys", "mask", "nonterminals", "is_empty"])
+
+
+def children_signature(children):
+    """Identify a list of freshly created children by the sequence of their symbols"""
+    return tuple(child[0] for child in children)
+
+
+class GrammarIndex:
+    """Precompiled view of a grammar, built once per fuzzer.
+
+    `expansion_key` is the (slow) function which parses an expansion into its coverage keys and
+    `expansion_to_children` is the fuzzer's conversion of an expansion into derivation tree children.
+    Both are only invoked while compiling, afterwards every expansion is resolved by a dictionary lookup.
+    All keys are interned into `key_ids`, so coverage can be tracked as bitmasks.
+    """
+
+    def __init__(self, grammar, expansion_key, expansion_to_children):
+        self._expansion_key = expansion_key
+        self.key_ids = KeyIds()
+        self._by_expansion = {}
+        self._by_children = {}
+        self.expansions = {}
+
+        for symbol, expansions in grammar.items():
+            records = []
+            for expansion in expansions:
+                if isinstance(expansion, tuple):
+                    expansion = expansion[0]
+
+                children = expansion_to_children(expansion)
+                keys = tuple(expansion_key(symbol, expansion))
+                record = CompiledExpansion(
+                    symbol,
+                    expansion,
+                    keys,
+                    self.key_ids.mask(keys),
+                    tuple(nonterminals(expansion)),
+                    len(children) > 0 and children[0][0] == EMPTY_SYMBOL
+                )
+
+                records.append(record)
+                self._by_expansion[(symbol, expansion)] = record
+                self._by_children.setdefault((symbol, children_signature(children)), record)
+
+            self.expansions[symbol] = records
+
+    def record(self, symbol, expansion):
+        """Return the compiled record of (symbol, expansion) or None if it is not part of the grammar.
+        `expansion` can be an expansion string or a list of children created by `expansion_to_children`."""
+        if isinstance(expansion, tuple):
+            expansion = expansion[0]
+
+        if isinstance(expansion, str):
+            return self._by_expansion.get((symbol, expansion))
+
+        return self._by_children.get((symbol, children_signature(expansion)))
+
+    def keys(self, symbol, expansion):
+        """Return the coverage keys of (symbol, expansion), parsing it only if it was not compiled"""
+        record = self.record(symbol, expansion)
+
+        if record is None:
+            return tuple(self._expansion_key(symbol, expansion))
+
+        return record.keys
+
+    def mask(self, symbol, expansion):
+        """Return the coverage keys of (symbol, expansion) as a bitmask"""
+        record = self.record(symbol, expansion)
+
+        if record is None:
+            return self.key_ids.mask(self._expansion_key(symbol, expansion))
+
+        return record.mask
+
+    def reachable_mask(self, symbol, max_depth, known=None):
+        """Keys of all expansions reachable from `symbol` in less than `max_depth` expansion steps.
+        `known(nonterminal, depth)` may return an already computed mask for a nonterminal, which is then
+        used instead of searching below it."""
+        if max_depth <= 0:
+            return 0
+
+        mask = 0
+        seen = {symbol}
+        level = [symbol]
+        depth = 0
+
+        while level and depth < max_depth:
+            remaining = max_depth - depth - 1
+            next_level = []
+
+            for current in level:
+                for record in self.expansions[current]:
+                    mask |= record.mask
+                    for nonterminal in record.nonterminals:
+                        if nonterminal in seen or nonterminal not in self.expansions:
+                            continue
+                        seen.add(nonterminal)
+
+                        if remaining <= 0:
+                            continue
+
+                        known_mask = known(nonterminal, remaining) if known is not None else None
+                        if known_mask is None:
+                            next_level.append(nonterminal)
+                        else:
+                            mask |= known_mask
+
+            level = next_level
+            depth += 1
+
+        return mask
+
+    def empty_index(self, symbol, possible_children):
+        """Index of the `<empty>` alternative among `possible_children`, or None if there is none"""
+        for idx, children in enumerate(possible_children):
+            record = self.record(symbol, children)
+            if record is None:
+                is_empty = len(children) > 0 and children[0][0] == EMPTY_SYMBOL
+            else:
+                is_empty = record.is_empty
+
+            if is_empty:
+                return idx
+
+        return None
+
+
+class UncoveredDistances:
+    """Minimum expansion depth at which each symbol reaches a key which is not covered yet.
+
+    A symbol with an uncovered key in one of its own expansions has distance 1, otherwise its distance is one
+    more than the smallest distance of the nonterminals it references (infinite if none reaches uncovered keys).
+    This matches the `max_depth` at which `_max_expansion_coverage` starts returning new coverage for the symbol.
+    Distances only grow while coverage grows, `cover` repairs them by walking the reverse edges of the grammar
+    from the symbols which lost their last uncovered key, instead of searching the grammar again.
+    """
+
+    def __init__(self, index, covered_mask=0):
+        self.successors = {}
+        self.predecessors = {}
+        self.own_mask = {}
+        self.key_symbols = {}
+        self.covered_mask = covered_mask
+
+        for symbol, records in index.expansions.items():
+            own_mask = 0
+            successors = set()
+            for record in records:
+                own_mask |= record.mask
+                successors.update(n for n in record.nonterminals if n in index.expansions)
+
+            self.own_mask[symbol] = own_mask
+            self.successors[symbol] = successors
+            self.predecessors.setdefault(symbol, set())
+            for successor in successors:
+                self.predecessors.setdefault(successor, set()).add(symbol)
+            for key_id in bit_ids(own_mask):
+                self.key_symbols.setdefault(key_id, []).append(symbol)
+
+        self.distance = dict.fromkeys(self.own_mask, INFINITY)
+        self._repair(set(self.own_mask))
+
+    def _is_source(self, symbol):
+        return self.own_mask[symbol] & ~self.covered_mask != 0
+
+    def _repair(self, affected):
+        """Recompute the distance of the `affected` symbols, all other distances must be up to date"""
+        heap = []
+        for symbol in affected:
+            if self._is_source(symbol):
+                distance = 1
+            else:
+                distance = min((self.distance[s] + 1 for s in self.successors[symbol] if s not in affected),
+                               default=INFINITY)
+
+            self.distance[symbol] = distance
+            if distance < INFINITY:
+                heapq.heappush(heap, (distance, symbol))
+
+        while heap:
+            distance, symbol = heapq.heappop(heap)
+            if distance > self.distance[symbol]:
+                continue
+
+            for predecessor in self.predecessors[symbol]:
+                if predecessor in affected and distance + 1 < self.distance[predecessor]:
+                    self.distance[predecessor] = distance + 1
+                    heapq.heappush(heap, (distance + 1, predecessor))
+
+    def cover(self, mask):
+        """Mark the keys in `mask` as covered and update the distances which depended on them"""
+        new_mask = mask & ~self.covered_mask
+        if not new_mask:
+            return
+
+        self.covered_mask |= new_mask
+
+        lost_sources = {symbol for key_id in bit_ids(new_mask) for symbol in self.key_symbols.get(key_id, [])
+                        if self.distance[symbol] == 1 and not self._is_source(symbol)}
+
+        # Only symbols whose shortest path went through a lost source can get further away
+        affected = set(lost_sources)
+        queue = deque(lost_sources)
+        while queue:
+            symbol = queue.popleft()
+            for predecessor in self.predecessors[symbol]:
+                if (predecessor not in affected and not self._is_source(predecessor) and
+                        self.distance[predecessor] == self.distance[symbol] + 1):
+                    affected.add(predecessor)
+                    queue.append(predecessor)
+
+        self._repair(affected)
+
+    def child_distance(self, mask, children):
+        """Distance to uncovered keys when expanding a node into `children`, whose own keys are in `mask`"""
+        if mask & ~self.covered_mask:
+            return 0
+
+        return min((self.distance[c_symbol] for (c_symbol, _) in children if c_symbol in self.distance),
+                   default=INFINITY)
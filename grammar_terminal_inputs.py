@@ -1,11 +1,28 @@
+import argparse
 import json
+import random
 import re
-import sys
+from functools import partial
 
-from fuzzingbook.Grammars import RE_NONTERMINAL, START_SYMBOL, nonterminals
+from fuzzingbook.Grammars import RE_NONTERMINAL, START_SYMBOL
 from fuzzingbook.GrammarFuzzer import all_terminals
 from fuzzingbook.GrammarCoverageFuzzer import GrammarCoverageFuzzer
 
+from coverage_map import write_coverage_map
+from coverage_memo import DEFAULT_MEMO_SIZE, CoverageMemo
+from coverage_set import CoverageSet, bit_count
+from derivation_tree import Frontier, TerminalsCache, any_possible_expansions, expanded_nodes, possible_expansions
+from generation_budget import BudgetExhausted, add_budget_arguments, budget_from_arguments, coverage_report
+from grammar_index import INFINITY, GrammarIndex, UncoveredDistances
+from input_generation import generate_input_sets, iter_input_sets
+from input_scheduling import GENERATION_ORDER, ORDERS, action_count, order_inputs, shard_inputs
+from input_writer import InputWriter, read_inputs
+from replay_plan import write_replay_plan
+from suite_minimization import minimize_inputs
+
+# Identifies the inputs produced by this script in the input cache
+FUZZER_VARIANT = "terminal"
+
 
 def expansion_key(symbol, expansion):
     """Convert (symbol, children) into a key. `children` can be an expansion string or a derivation tree."""
@@ -36,67 +53,88 @@ def expansion_key(symbol, expansion):
 
 class TerminalCoverageGrammar(GrammarCoverageFuzzer):
     def __init__(self, *args, **kwargs):
+        memo_size = kwargs.pop("memo_size", DEFAULT_MEMO_SIZE)
+        # Private generator, inputs only depend on the seed and not on other users of the `random` module
+        self.random = random.Random(kwargs.pop("seed", None))
+        self._terminals = TerminalsCache()
+        self._frontier = None
+        # GenerationBudget checked while the derivation trees grow
+        self.budget = None
         # invoke superclass __init__(), passing all arguments
         super().__init__(*args, **kwargs)
         self.last_symbol = ""
         self.last_symbol_count = 0
+        self.memo = CoverageMemo(memo_size)
+        self.index = GrammarIndex(self.grammar,
+                                  lambda symbol, expansion: [expansion_key(symbol, expansion)],
+                                  self.expansion_to_children)
+        self.uncovered = UncoveredDistances(self.index, self.coverage_mask)
+
+    def reset_coverage(self):
+        """Clear the coverage and everything derived from it, so a reused fuzzer starts like a new one"""
+        self.coverage_mask = 0
+        self.last_symbol = ""
+        self.last_symbol_count = 0
+        # The size of the last tree decides when choose_node_expansion falls back to <empty>
+        self.derivation_tree = []
+        # Also called by the superclass __init__, before the distances and the memo exist
+        if hasattr(self, "uncovered"):
+            self.uncovered = UncoveredDistances(self.index, self.coverage_mask)
+            self.memo.clear()
+
+    @property
+    def covered_expansions(self):
+        """Read-only view of the covered keys, coverage is stored as a bitmask of key IDs"""
+        return CoverageSet(self.index.key_ids, self.coverage_mask)
+
+    def expansion_coverage(self):
+        return self.covered_expansions
+
+    def cover(self, mask):
+        if self.log:
+            for key in self.index.key_ids.keys_of(mask & ~self.coverage_mask):
+                print("Now covered:", key)
+
+        if mask & ~self.coverage_mask:
+            self.uncovered.cover(mask)
+            self.coverage_mask |= mask
+            self.memo.invalidate()
 
     def _max_expansion_coverage(self, symbol, max_depth):
+        return CoverageSet(self.index.key_ids, self._max_expansion_mask(symbol, max_depth))
+
+    def max_expansion_coverage(self, symbol=None, max_depth=float('inf')):
+        """Return the keys not covered yet which can be reached from `symbol` (default: start symbol)
+        within `max_depth` expansions"""
+        if symbol is None:
+            symbol = self.start_symbol
+
+        return self._max_expansion_coverage(symbol, max_depth)
+
+    def _uncovered(self, mask):
+        return mask & ~self.coverage_mask
+
+    def _known_expansion_mask(self, symbol, max_depth):
+        return self.memo.lookup((symbol, max_depth), self._uncovered)
+
+    def _max_expansion_mask(self, symbol, max_depth):
         if max_depth <= 0:
-            return set()
-
-        expansions = set()
-        self._symbols_seen.add(symbol)
-        Q = [symbol]
-
-        curDepth = 0
-        elementsToDepthIncrease = 1
-        nextElementsToDepthIncrease = 0
-
-        while Q != []:
-            current = Q.pop(0)
-            sum = 0
-
-            #process
-            seen_non_terminals = []
-            for expansion in self.grammar[current]:
-                expansions.add(expansion_key(current, expansion))
-                for nonterminal in nonterminals(expansion):
-                    if nonterminal not in self._symbols_seen:
-                        sum += 1
-                        Q.append(nonterminal)
-                        seen_non_terminals.append(nonterminal)
-                        #self._symbols_seen.add(nonterminal) #moved below
-            #end process
-
-            #bookkeeping for iterative BFS with depth limiting
-            nextElementsToDepthIncrease += sum
-            elementsToDepthIncrease -= 1
-            if (elementsToDepthIncrease == 0):
-                curDepth += 1
-                if curDepth >= max_depth:
-                    return expansions
-                elementsToDepthIncrease = nextElementsToDepthIncrease
-                nextElementsToDepthIncrease = 0
-
-            #It's safer to do it here, not in loop above, in order to avoid pruning tuples that have the same nonterminals but different terminals on same depth
-            for nt in seen_non_terminals:
-                self._symbols_seen.add(nt)
-
-        return expansions
+            return 0
 
-    def add_coverage(self, symbol, new_children):
-        key = expansion_key(symbol, new_children)
+        return self.memo.get(
+            (symbol, max_depth),
+            lambda: self._uncovered(self.index.reachable_mask(symbol, max_depth, self._known_expansion_mask)),
+            self._uncovered
+        )
 
-        if self.log and key not in self.covered_expansions:
-            print("Now covered:", key)
-        self.covered_expansions.add(key)
+    def add_coverage(self, symbol, new_children):
+        self.cover(self.index.mask(symbol, new_children))
 
     def _choose_node_expansion(self, node, possible_children):
         # Prefer uncovered expansions
         (symbol, children) = node
         uncovered_children = [c for (i, c) in enumerate(possible_children)
-                              if expansion_key(symbol, c) not in self.covered_expansions]
+                              if self.index.mask(symbol, c) & ~self.coverage_mask]
         index_map = [i for (i, c) in enumerate(possible_children)
                      if c in uncovered_children]
 
@@ -109,25 +147,67 @@ class TerminalCoverageGrammar(GrammarCoverageFuzzer):
 
         return index_map[index]
 
+    def choose_random_node_expansion(self, node, children_alternatives):
+        """Select one of `children_alternatives` with the fuzzer's own generator and save it as covered"""
+        (symbol, children) = node
+        index = self.random.randrange(0, len(children_alternatives))
+        self.add_coverage(symbol, children_alternatives[index])
+        return index
+
+    def choose_uncovered_node_expansion(self, node, children_alternatives):
+        return self.choose_random_node_expansion(node, children_alternatives)
+
+    def choose_covered_node_expansion(self, node, children_alternatives):
+        return self.choose_random_node_expansion(node, children_alternatives)
+
+    def choose_tree_expansion(self, tree, children):
+        return self.random.randrange(0, len(children))
+
+    def _new_child_mask(self, children, max_depth):
+        new_cov = 0
+        for (c_symbol, _) in children:
+            if c_symbol in self.grammar:
+                new_cov |= self._max_expansion_mask(c_symbol, max_depth)
+
+        return new_cov
+
     def new_child_coverage(self, symbol, children, max_depth=float('inf')):
         """Return new coverage that would be obtained by expanding (symbol, children)"""
-        new_cov = self._new_child_coverage(children, max_depth)
-        new_cov.add(expansion_key(symbol, children))
-        new_cov -= self.expansion_coverage()   # -= is set subtraction
-        return new_cov
+        new_cov = self._new_child_mask(children, max_depth) | self.index.mask(symbol, children)
+        return CoverageSet(self.index.key_ids, new_cov & ~self.coverage_mask)
 
-    def get_empty(self, possible_children):
-        return [idx for idx, child in enumerate(possible_children) if child[0][0] == "<empty>"][0]
+    def new_coverages(self, node, possible_children):
+        """Return coverage to be obtained for each child at minimum depth"""
+        (symbol, children) = node
+        # Depths below the distance to the closest uncovered key cannot produce new coverage, skip them
+        min_depth = min(self.uncovered.child_distance(self.index.mask(symbol, c), c) for c in possible_children)
+        if min_depth == INFINITY:
+            return None
+
+        for max_depth in range(min_depth, len(self.grammar)):
+            new_coverages = [
+                self.new_child_coverage(symbol, c, max_depth)
+                for c in possible_children]
+            max_new_coverage = max(len(new_coverage)
+                                   for new_coverage in new_coverages)
+            if max_new_coverage > 0:
+                # Uncovered node found
+                return new_coverages
+
+        # All covered
+        return None
 
     def choose_node_expansion(self, node, possible_children):
         (symbol, children) = node
         new_coverages = self.new_coverages(node, possible_children)
+        empty = self.index.empty_index(symbol, possible_children)
 
         if new_coverages is None:
             # In a loop, look for empty
-            if ((hasattr(self, 'derivation_tree') and len(all_terminals(self.derivation_tree)) > len(self.grammar)) or
-                    (len(self.covered_expansions) >= len(self.grammar))) and "<empty>" in str(possible_children):
-                return self.get_empty(possible_children)
+            if ((hasattr(self, 'derivation_tree') and
+                 len(self._terminals.all_terminals(self.derivation_tree)) > len(self.grammar)) or
+                    (bit_count(self.coverage_mask) >= len(self.grammar))) and empty is not None:
+                return empty
             else:
                 # All expansions covered - use superclass method
                 return self.choose_covered_node_expansion(node, possible_children)
@@ -135,8 +215,8 @@ class TerminalCoverageGrammar(GrammarCoverageFuzzer):
         if node == self.last_symbol:
             if self.last_symbol_count < 3:
                 self.last_symbol_count += 1
-            elif "<empty>" in str(possible_children):
-                return self.get_empty(possible_children)
+            elif empty is not None:
+                return empty
         else:
             self.last_symbol = node
             self.last_symbol_count = 0
@@ -154,48 +234,150 @@ class TerminalCoverageGrammar(GrammarCoverageFuzzer):
         new_children = children_with_max_new_coverage[new_children_index]
 
         # Save the expansion as covered
-        key = expansion_key(symbol, new_children)
-
-        if self.log:
-            print("Now covered:", key)
-        self.covered_expansions.add(key)
+        self.cover(self.index.mask(symbol, new_children))
 
         return index_map[new_children_index]
 
+    def fuzz(self):
+        self._terminals.clear()
+        return super().fuzz()
+
+    def expand_tree_once(self, tree):
+        """Expand one of the open nonterminals of `tree`, tracked incrementally while the tree grows"""
+        if self._frontier is None or self._frontier.tree is not tree:
+            self._frontier = Frontier(tree)
+
+        if len(self._frontier) == 0:
+            return tree
+
+        if self.budget is not None:
+            self.budget.check_tree(self._frontier.size)
+
+        return self._frontier.expand(self.choose_tree_expansion, self.expand_node)
 
-def generate_inputs(grammar):
+    def tree_mask(self, tree):
+        """Coverage keys of all expansions in `tree`, as a bitmask"""
+        mask = 0
+        for (symbol, children) in expanded_nodes(tree):
+            mask |= self.index.mask(symbol, children)
+
+        return mask
+
+    def possible_expansions(self, node):
+        if self._frontier is not None and self._frontier.tree is node:
+            return len(self._frontier)
+
+        return possible_expansions(node)
+
+    def any_possible_expansions(self, node):
+        if self._frontier is not None and self._frontier.tree is node:
+            return len(self._frontier) > 0
+
+        return any_possible_expansions(node)
+
+
+def coverage_target(grammar):
+    """Keys which the inputs of every seed should cover, as a mask of the key IDs assigned for `grammar`"""
     fuzzer = TerminalCoverageGrammar(grammar, min_nonterminals=1, log=False)
-    max_exp = fuzzer.max_expansion_coverage(max_depth=len(grammar))
+    return fuzzer.max_expansion_coverage(max_depth=len(grammar)).mask
+
+
+def iter_inputs(grammar, max_exp=None, seed=None, budget=None):
+    """Generate inputs until `max_exp` (default: `coverage_target(grammar)`) is covered, yielding each input as soon
+    as it adds coverage. The same `seed` always yields the same inputs in the same order.
+    Generation also stops when the GenerationBudget `budget` is exhausted. The CoverageReport of the produced inputs
+    is the return value of the generator, it also lists the elements covered by each input."""
+    fuzzer = TerminalCoverageGrammar(grammar, min_nonterminals=1, log=False, seed=seed)
+    if max_exp is None:
+        max_exp = fuzzer.max_expansion_coverage(max_depth=len(grammar)).mask
+    if budget is not None:
+        budget = budget.start()
+        fuzzer.budget = budget
     reached = set()
+    input_masks = []
+    exhausted = None
 
     count = 0
-    while len(max_exp - fuzzer.expansion_coverage()) > 0:
-        original_set_diff = max_exp - fuzzer.expansion_coverage()
-        inp = fuzzer.fuzz()
-        new_set_diff = max_exp - fuzzer.expansion_coverage()
-
-        if len(original_set_diff - new_set_diff) > 0:
+    covered = fuzzer.coverage_mask
+    missing = max_exp & ~covered
+    while missing:
+        try:
+            inp = fuzzer.fuzz()
+        except BudgetExhausted as e:
+            # The interrupted input is discarded, so is the coverage it would have added
+            exhausted = e.reason
+            break
+
+        covered = fuzzer.coverage_mask
+        new_missing = max_exp & ~covered
+
+        # Coverage only grows, so any change means that new elements were covered
+        if new_missing != missing:
             count = 0
-            reached.add(inp)
-        elif original_set_diff == new_set_diff:
+            if inp not in reached:
+                reached.add(inp)
+                input_masks.append(fuzzer.tree_mask(fuzzer.derivation_tree))
+                yield inp
+
+                if new_missing and budget is not None and budget.inputs_exhausted(len(reached)):
+                    exhausted = "inputs"
+                    break
+        else:
             count += 1
             if count > 3:
                 print("Unable to produce %d elements with the grammar (%.2f)" %
-                      (len(new_set_diff), len(new_set_diff) / len(max_exp)))
+                      (bit_count(new_missing), bit_count(new_missing) / bit_count(max_exp)))
                 break
 
-    return reached
+        missing = new_missing
 
+    print("Coverage memo (seed %s): %s" % (seed, fuzzer.memo))
+    return coverage_report(fuzzer.index.key_ids, max_exp, covered, input_masks, exhausted)
 
-def save_inputs_to_file(input_dir, inputs, package_name, seed_id):
-    filename = '%s/%s/inputs%02d.txt' % (input_dir, package_name, seed_id)
+
+def generate_inputs(grammar, max_exp=None, seed=None, budget=None):
+    """Same as `iter_inputs`, but return all inputs at once, in the order in which they were produced"""
+    return list(iter_inputs(grammar, max_exp, seed, budget))
+
+
+def input_file(input_dir, package_name, seed_id):
+    return '%s/%s/inputs%02d.txt' % (input_dir, package_name, seed_id)
+
+
+def coverage_map_file(input_dir, package_name, seed_id):
+    # Not a .txt file, so that it is not mistaken for an input file
+    return '%s/%s/inputCoverage%02d.tsv' % (input_dir, package_name, seed_id)
+
+
+def save_coverage_map_to_file(input_dir, input_coverage, package_name, seed_id):
+    """Write the elements covered by each input, see `coverage_map`"""
+    filename = coverage_map_file(input_dir, package_name, seed_id)
+    print(filename)
+    write_coverage_map(filename, input_coverage)
+
+
+def save_inputs_to_file(input_dir, inputs, package_name, seed_id, input_coverage=None):
+    filename = input_file(input_dir, package_name, seed_id)
     print(filename)
-    f = open(filename, 'w')
 
-    for x in inputs:
-        f.write(x + "\n")
+    with InputWriter(filename) as writer:
+        writer.write_all(inputs)
 
-    f.close()
+    if input_coverage is not None:
+        save_coverage_map_to_file(input_dir, input_coverage, package_name, seed_id)
+
+
+def minimized_input_file(input_dir, package_name, seed_id):
+    # Not named inputsNN.txt, so that it is not mistaken for another seed's inputs
+    return '%s/%s/minimizedInputs%02d.txt' % (input_dir, package_name, seed_id)
+
+
+def save_minimized_inputs_to_file(input_dir, inputs, package_name, seed_id):
+    filename = minimized_input_file(input_dir, package_name, seed_id)
+    print(filename)
+
+    with InputWriter(filename) as writer:
+        writer.write_all(inputs)
 
 
 def load_grammar(input_dir, package_name):
@@ -204,26 +386,118 @@ def load_grammar(input_dir, package_name):
         return json.load(f)
 
 
-def generate_experiments_inputs(input_dir, package_name, num_inputs):
-    for i in range(num_inputs):
-        grammar = load_grammar(input_dir, package_name)
-        inputs = generate_inputs(grammar)
-        save_inputs_to_file(input_dir, inputs, package_name, i)
+def fuzz_grammar(grammar, seeds=range(10), jobs=1, cache_dir=None, budget=None):
+    """Generate the input sets of `seeds` in-process. `grammar` is a grammar or the path of a grammar file.
+    Returns a GenerationResult with the inputs, the generation time, the error (if any) and the CoverageReport of
+    each seed, an invalid grammar raises right away. The GenerationBudget `budget` limits each set."""
+    return generate_input_sets(grammar, seeds, FUZZER_VARIANT, coverage_target, iter_inputs, jobs, cache_dir,
+                               budget=budget)
 
-if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        raise Exception("Script requires 2 arguments: (1) input directory and (2) package name (3) number of input "
-                        "sets [optional, default=10]")
 
-    input_d = sys.argv[1]
-    package = sys.argv[2]
+def shard_input_file(input_dir, package_name, seed_id, shard):
+    # Not named inputsNN.txt, so that it is not mistaken for another seed's inputs
+    return '%s/%s/shard%dInputs%02d.txt' % (input_dir, package_name, shard, seed_id)
+
+
+def save_shards_to_file(input_dir, inputs, package_name, seed_id, num_shards):
+    """Split `inputs` into `num_shards` files which take about the same time to replay. There are never more shards
+    than inputs, an empty shard file would look like a seed without inputs."""
+    if num_shards > len(inputs):
+        print("Input set %02d has only %d inputs, writing %d shards instead of %d" % (seed_id, len(inputs),
+                                                                                   len(inputs), num_shards))
+        num_shards = len(inputs)
+
+    for (shard, indices) in enumerate(shard_inputs(inputs, num_shards)):
+        filename = shard_input_file(input_dir, package_name, seed_id, shard)
+        print("%s (%d actions)" % (filename, sum(action_count(inputs[i]) for i in indices)))
 
-    if len(sys.argv) >= 4:
-        num_inputs = int(sys.argv[3])
+        with InputWriter(filename) as writer:
+            writer.write_all(inputs[i] for i in indices)
+
+
+def replay_plan_file(input_dir, package_name, seed_id):
+    return '%s/%s/replayPlan%02d.json' % (input_dir, package_name, seed_id)
+
+
+def save_replay_plan_to_file(input_dir, inputs, package_name, seed_id):
+    """Write the prefix tree of `inputs`, which shows the actions saved by replaying shared prefixes once"""
+    filename = replay_plan_file(input_dir, package_name, seed_id)
+    trie = write_replay_plan(filename, inputs)
+    print("%s (%d of %d actions saved by sharing prefixes)" % (filename, trie.saved_actions, trie.actions))
+
+
+def process_input_set(input_dir, package_name, seed_id, report, minimize=False, order=GENERATION_ORDER, shards=1):
+    """Stages which follow the generation of the input file of `seed_id`: ordering, coverage map, replay plan,
+    minimization and sharding. `report` is the CoverageReport of the set, None if it is unknown."""
+    inputs = read_inputs(input_file(input_dir, package_name, seed_id))
+    input_coverage = report.input_coverage if report is not None else None
+
+    if order != GENERATION_ORDER:
+        indices = order_inputs(inputs, order)
+        inputs = [inputs[i] for i in indices]
+        if input_coverage is not None:
+            input_coverage = [input_coverage[i] for i in indices]
+        save_inputs_to_file(input_dir, inputs, package_name, seed_id)
+
+    save_replay_plan_to_file(input_dir, inputs, package_name, seed_id)
+
+    if input_coverage is not None:
+        save_coverage_map_to_file(input_dir, input_coverage, package_name, seed_id)
+
+        if minimize:
+            save_minimized_inputs_to_file(input_dir, minimize_inputs(inputs, input_coverage), package_name, seed_id)
     else:
-        num_inputs = 10
+        # E.g. a cached set cut short by --max-inputs, the report of the complete set does not apply to it
+        print("Input set %02d has no coverage report: no coverage map written%s" % (
+            seed_id, ", not minimized" if minimize else ""))
 
-    generate_experiments_inputs(input_d, package, num_inputs)
+    if shards > 1:
+        save_shards_to_file(input_dir, inputs, package_name, seed_id, shards)
+
+
+def generate_experiments_inputs(input_dir, package_name, num_inputs, jobs=1, cache_dir=None, budget=None,
+                                minimize=False, order=GENERATION_ORDER, shards=1):
+    grammar = load_grammar(input_dir, package_name)
+    output = partial(input_file, input_dir, package_name)
+
+    failed = []
+
+    # Every input set is streamed to its file by the process which generates it
+    for input_set in iter_input_sets(grammar, range(num_inputs), FUZZER_VARIANT, coverage_target, iter_inputs, jobs,
+                                     cache_dir, output=output, budget=budget):
+        if input_set.error is not None:
+            print("Unable to generate input set %02d:\n%s" % (input_set.seed, input_set.error))
+            failed.append(input_set.seed)
+        else:
+            if input_set.report is not None:
+                print("Input set %02d: %s (%.2f seconds)" % (input_set.seed, input_set.report, input_set.seconds))
+            process_input_set(input_dir, package_name, input_set.seed, input_set.report, minimize, order, shards)
+
+    if failed:
+        raise Exception("Unable to generate input sets %s" % sorted(failed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate input sets covering all terminals of a mined grammar")
+    parser.add_argument("input_dir", help="input directory")
+    parser.add_argument("package", help="package name, subdirectory of the input directory containing grammar.txt")
+    parser.add_argument("num_inputs", nargs="?", type=int, default=10, help="number of input sets (default: 10)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of input sets generated in parallel (default: 1)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="reuse input sets generated before for the same grammar from this directory")
+    parser.add_argument("--minimize", action="store_true",
+                        help="also write the smallest covering subset of each input set found (minimizedInputsNN.txt)")
+    parser.add_argument("--order", choices=ORDERS, default=GENERATION_ORDER,
+                        help="order of the inputs by number of actions (default: %s)" % GENERATION_ORDER)
+    parser.add_argument("--shards", type=int, default=1,
+                        help="also split each input set into this many files with balanced replay times "
+                             "(shardKInputsNN.txt)")
+    add_budget_arguments(parser)
+    args = parser.parse_args()
+
+    generate_experiments_inputs(args.input_dir, args.package, args.num_inputs, args.jobs, args.cache_dir,
+                                budget_from_arguments(args), args.minimize, args.order, args.shards)
 
 
 """
@@ -0,0 +1,84 @@
+import argparse
+import os
+
+from coverage_store import CoverageStore
+from eval import RUN_COLUMNS, STATEMENT_INDEX_FILE, load_experiments
+from measurement import coverage_files, read_coverage
+from run_coverage import RunCoverage, read_run_files, read_universe
+from statement_index import StatementIndex
+
+
+def statement_files(run_dir):
+    """Files with the statements reached by a run, the *-statements-* files in the coverage directories below
+    `run_dir` (the files ResultBuilder reads)"""
+    files = []
+    for (root, _, names) in os.walk(run_dir):
+        if "coverage" in root.split(os.sep):
+            files += [os.path.join(root, name) for name in names if "-statements-" in name]
+
+    return sorted(files)
+
+
+def ingest_experiments(store, e, rq, jobs=1, statement_index=STATEMENT_INDEX_FILE):
+    """Store the run table of the experiments root `e` and the coverage of every run with reached statements"""
+    statements = StatementIndex(statement_index)
+    apps, coverage_gts, runs = load_experiments(e, rq, statements, jobs)
+    statements.save()
+
+    store.write_runs(rq, apps, coverage_gts, runs[RUN_COLUMNS])
+    print("Stored %d runs of %d apps" % (len(runs), len(apps)))
+
+    for (group, app) in enumerate(apps):
+        app_runs = runs[runs["group"] == group]
+        universe = read_universe(os.path.join(e, app, "apks", app + ".apk.json"))
+        universe_size = len(universe)
+
+        names = []
+        bitmaps = []
+        for (seed, path) in zip(app_runs["Seed"], app_runs["path"]):
+            files = statement_files(path)
+            if files:
+                names.append(seed)
+                bitmaps.append(read_run_files(universe, files))
+
+        if names:
+            store.write_coverage(app, RunCoverage.from_bitmaps(universe, names, bitmaps, universe_size))
+            print("Stored the coverage of %d runs of %s" % (len(names), app))
+
+
+def ingest_seeds(store, app, apk_json, seeds_dir, package):
+    """Store the coverage of the seed directories of an exploration, as read by measurement.py, under `app`"""
+    store.write_coverage(app, read_coverage(apk_json, coverage_files(seeds_dir, package)))
+    print("Stored the coverage of the seeds of %s" % app)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert experiment results into a binary coverage store, read by "
+                                                 "eval.py and measurement.py with --store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    experiments = subparsers.add_parser("experiments", help="store the runs of an experiments root and their coverage")
+    experiments.add_argument("store", help="coverage store directory")
+    experiments.add_argument("experiments", help="experiments root, one directory per app")
+    experiments.add_argument("--rq", default="rq1",
+                             help="research question, subdirectory of each app containing its runs (default: rq1)")
+    experiments.add_argument("-j", "--jobs", type=int, default=1,
+                             help="number of apps loaded in parallel (default: 1)")
+    experiments.add_argument("--statement-index", default=STATEMENT_INDEX_FILE,
+                             help="file caching the number of statements of each APK (default: %s)" %
+                                  STATEMENT_INDEX_FILE)
+
+    seeds = subparsers.add_parser("seeds", help="store the coverage of the seed directories of an exploration")
+    seeds.add_argument("store", help="coverage store directory")
+    seeds.add_argument("app", help="name of the app in the store")
+    seeds.add_argument("apk_json", help="instrumentation file of the app, <apk>.apk.json")
+    seeds.add_argument("seeds_dir", help="directory with one seed* directory per run, e.g. merge-input-dir")
+    seeds.add_argument("package", help="package name of the app, the coverage of a seed is in model/<package>/")
+
+    args = parser.parse_args()
+
+    if args.command == "experiments":
+        ingest_experiments(CoverageStore(args.store), os.path.abspath(args.experiments), args.rq, args.jobs,
+                           args.statement_index)
+    else:
+        ingest_seeds(CoverageStore(args.store), args.app, args.apk_json, args.seeds_dir, args.package)
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import shutil
+
+from generation_budget import CoverageReport
+from input_writer import InputWriter, read_inputs
+
+# Increase when a change to the fuzzers alters the inputs produced for a seed, so old entries are not reused
+CACHE_VERSION = 2
+
+
+def grammar_hash(grammar):
+    """Hash of the grammar content, independent of the formatting and rule order of the file it was loaded from"""
+    content = json.dumps(grammar, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class InputCache:
+    """Content-addressed store of generated input sets.
+
+    Input sets are stored in `cache_dir` under a key derived from the grammar content, the fuzzer variant and the
+    `use_non_terminals` flag, one file per seed plus the CoverageReport of the set. Since generation is deterministic
+    for a seed, a cached set is the same set that would be generated again.
+    """
+
+    def __init__(self, cache_dir, grammar, variant, use_non_terminals=False):
+        key = "%s|%s|%s|%d" % (grammar_hash(grammar), variant, use_non_terminals, CACHE_VERSION)
+        self.key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        self.entry_dir = os.path.join(cache_dir, self.key[:2], self.key)
+
+    def _filename(self, seed):
+        return os.path.join(self.entry_dir, "seed%02d.txt" % seed)
+
+    def _report_filename(self, seed):
+        return os.path.join(self.entry_dir, "seed%02d.json" % seed)
+
+    def load(self, seed):
+        """Return the cached inputs of `seed`, or None if they were never stored"""
+        try:
+            return read_inputs(self._filename(seed))
+        except FileNotFoundError:
+            return None
+
+    def load_report(self, seed):
+        """Return the CoverageReport stored with the inputs of `seed`, or None if there is none"""
+        try:
+            with open(self._report_filename(seed)) as f:
+                return CoverageReport(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def _tmp_filename(self, seed):
+        os.makedirs(self.entry_dir, exist_ok=True)
+        return "%s.%d.tmp" % (self._filename(seed), os.getpid())
+
+    def _store_report(self, seed, report):
+        if report is None:
+            return
+
+        # The report is stored first, the inputs file marks a complete entry
+        tmp_filename = self._tmp_filename(seed)
+        with open(tmp_filename, 'w') as f:
+            json.dump(report._asdict(), f)
+        os.replace(tmp_filename, self._report_filename(seed))
+
+    def store(self, seed, inputs, report=None):
+        self._store_report(seed, report)
+        # Write to a temporary file first, concurrent readers never see a partial set
+        tmp_filename = self._tmp_filename(seed)
+        with InputWriter(tmp_filename) as writer:
+            writer.write_all(inputs)
+        os.replace(tmp_filename, self._filename(seed))
+
+    def store_file(self, seed, filename, report=None):
+        """Store the complete input set which was written to `filename`"""
+        self._store_report(seed, report)
+        tmp_filename = self._tmp_filename(seed)
+        shutil.copyfile(filename, tmp_filename)
+        os.replace(tmp_filename, self._filename(seed))
@@ -0,0 +1,173 @@
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from collections import namedtuple
+
+from input_cache import InputCache
+from input_writer import InputWriter
+
+# Outcome of one seed: its inputs (None if they were streamed to a file), the time spent generating them (0 for
+# cached sets), the error message if generation failed and the CoverageReport (None if it is unknown)
+InputSet = namedtuple("InputSet", ["seed", "inputs", "seconds", "error", "report"])
+
+# The same, collected per seed
+GenerationResult = namedtuple("GenerationResult", ["inputs", "timings", "errors", "reports"])
+
+# Grammar, coverage target, generator, budget and destination shared by all input sets produced in a worker process
+_worker_grammar = None
+_worker_max_exp = None
+_worker_generate = None
+_worker_budget = None
+_worker_output = None
+_worker_cache = None
+
+
+def _init_worker(grammar, max_exp, generate, budget, output, cache):
+    global _worker_grammar, _worker_max_exp, _worker_generate, _worker_budget, _worker_output, _worker_cache
+    _worker_grammar = grammar
+    _worker_max_exp = max_exp
+    _worker_generate = generate
+    _worker_budget = budget
+    _worker_output = output
+    _worker_cache = cache
+
+
+def _drain(inputs, consume):
+    """Pass every input of `inputs` to `consume` and return the return value of the generator"""
+    inputs = iter(inputs)
+    while True:
+        try:
+            inp = next(inputs)
+        except StopIteration as stop:
+            return stop.value
+
+        consume(inp)
+
+
+def _generate_seed(seed_id):
+    # Each input set is generated with its own seed, its content does not depend on the worker which produced it
+    start = time.perf_counter()
+    inputs = None
+    report = None
+    error = None
+    filename = None
+
+    try:
+        generator = _worker_generate(_worker_grammar, max_exp=_worker_max_exp, seed=seed_id, budget=_worker_budget)
+
+        if _worker_output is None:
+            inputs = []
+            report = _drain(generator, inputs.append)
+        else:
+            # Stream the inputs to the file while they are produced instead of keeping them in memory
+            filename = _worker_output(seed_id)
+            print(filename)
+            with InputWriter(filename) as writer:
+                report = _drain(generator, writer.write)
+
+        # Sets cut short by a budget are not what a rerun without (or with another) budget would produce
+        if _worker_cache is not None and (report is None or report.exhausted is None):
+            if _worker_output is None:
+                _worker_cache.store(seed_id, inputs, report)
+            else:
+                _worker_cache.store_file(seed_id, filename, report)
+    except Exception:
+        inputs = None
+        error = traceback.format_exc()
+        # The inputs written before the error would be taken for a complete input set
+        if filename is not None and os.path.exists(filename):
+            os.remove(filename)
+
+    return InputSet(seed_id, inputs, time.perf_counter() - start, error, report)
+
+
+def load_grammar_file(grammar):
+    """Accept either a grammar or the path of a JSON grammar file"""
+    if isinstance(grammar, dict):
+        return grammar
+
+    with open(grammar) as f:
+        return json.load(f)
+
+
+def iter_input_sets(grammar, seeds, variant, target, generate, jobs=1, cache_dir=None, use_non_terminals=False,
+                    output=None, budget=None):
+    """Produce the input set of each seed in `seeds`, yielding an InputSet as soon as a set is ready: cached sets
+    first, generated ones in the order in which they finish.
+
+    `target(grammar)` computes the coverage target once for all seeds and `generate(grammar, max_exp=, seed=,
+    budget=)` yields the inputs of a single set and returns its CoverageReport. Both must be picklable (module level
+    functions or partials of them), so that they can be sent to the `jobs` worker processes. The GenerationBudget
+    `budget` applies to each set on its own.
+
+    If `output(seed)` is given, each set is streamed to the file it names while it is generated and `inputs` is
+    None; otherwise `inputs` is the list of inputs in generation order. The file of a set whose generation fails is
+    removed.
+    """
+    seeds = list(seeds)
+    missing_seeds = seeds
+
+    cache = None
+    if cache_dir is not None:
+        cache = InputCache(cache_dir, grammar, variant, use_non_terminals)
+        missing_seeds = []
+        max_inputs = budget.max_inputs if budget is not None else None
+        for seed_id in seeds:
+            inputs = cache.load(seed_id)
+            if inputs is None:
+                missing_seeds.append(seed_id)
+                continue
+
+            report = cache.load_report(seed_id)
+            if max_inputs is not None and len(inputs) > max_inputs:
+                # Generation is deterministic, the first inputs are the ones a budgeted run would produce.
+                # The report of the complete set does not apply to them.
+                inputs = inputs[:max_inputs]
+                report = None
+
+            if output is not None:
+                with InputWriter(output(seed_id)) as writer:
+                    writer.write_all(inputs)
+                inputs = None
+
+            print("Reusing cached input set %02d (%s)" % (seed_id, cache.key))
+            yield InputSet(seed_id, inputs, 0.0, None, report)
+
+    if not missing_seeds:
+        return
+
+    init_args = (grammar, target(grammar), generate, budget, output, cache)
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(processes=jobs, initializer=_init_worker, initargs=init_args)
+        results = pool.imap_unordered(_generate_seed, missing_seeds)
+    else:
+        pool = None
+        _init_worker(*init_args)
+        results = map(_generate_seed, missing_seeds)
+
+    try:
+        for input_set in results:
+            yield input_set
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def generate_input_sets(grammar, seeds, variant, target, generate, jobs=1, cache_dir=None, use_non_terminals=False,
+                        budget=None):
+    """Same as `iter_input_sets`, but wait for all seeds and return a GenerationResult"""
+    result = GenerationResult({}, {}, {}, {})
+
+    for input_set in iter_input_sets(load_grammar_file(grammar), seeds, variant, target, generate, jobs, cache_dir,
+                                     use_non_terminals, budget=budget):
+        result.timings[input_set.seed] = input_set.seconds
+        if input_set.error is None:
+            result.inputs[input_set.seed] = input_set.inputs
+            result.reports[input_set.seed] = input_set.report
+        else:
+            result.errors[input_set.seed] = input_set.error
+
+    return result
@@ -0,0 +1,55 @@
+import heapq
+
+GENERATION_ORDER = "generation"
+LONGEST_FIRST = "longest"
+SHORTEST_FIRST = "shortest"
+ORDERS = [GENERATION_ORDER, LONGEST_FIRST, SHORTEST_FIRST]
+
+
+def is_action(token):
+    """Whether `token` is replayed: a terminal which references a widget, e.g. `ClickEvent(w00)` or `w00.ClickEvent`,
+    or an action nonterminal of coverage inputs, e.g. `<ClickEvent(s01.w00)>` or `<s01.w00.ClickEvent>`. State
+    symbols such as `<s01>`, `<start>` and `<empty>` reference no widget and are not replayed."""
+    return "(" in token or "." in token
+
+
+def replay_actions(inp):
+    """Actions replayed for `inp`, see `is_action`"""
+    return [token for token in inp.split() if is_action(token)]
+
+
+def action_count(inp):
+    """Predicted number of actions replayed for `inp`"""
+    return len(replay_actions(inp))
+
+
+def order_inputs(inputs, order=LONGEST_FIRST):
+    """Indices of `inputs` in replay order. Inputs of the same length keep their generation order."""
+    indices = list(range(len(inputs)))
+
+    if order == LONGEST_FIRST:
+        indices.sort(key=lambda i: -action_count(inputs[i]))
+    elif order == SHORTEST_FIRST:
+        indices.sort(key=lambda i: action_count(inputs[i]))
+    elif order != GENERATION_ORDER:
+        raise Exception("Unknown input order %s, expected one of %s" % (order, ORDERS))
+
+    return indices
+
+
+def shard_inputs(inputs, num_shards):
+    """Split `inputs` into `num_shards` lists of indices with about the same number of actions each.
+
+    Longest processing time first: the longest remaining input goes to the shard with the fewest actions so far,
+    so the shards, replayed in parallel, finish at about the same time. Among shards with the same number of
+    actions the one with the fewest inputs is picked, so inputs without actions are spread too.
+    """
+    shards = [[] for _ in range(num_shards)]
+    loads = [(0, 0, shard) for shard in range(num_shards)]
+
+    for i in order_inputs(inputs, LONGEST_FIRST):
+        load, size, shard = heapq.heappop(loads)
+        shards[shard].append(i)
+        heapq.heappush(loads, (load + action_count(inputs[i]), size + 1, shard))
+
+    return shards
@@ -0,0 +1,54 @@
+import time
+
+DEFAULT_FLUSH_EVERY = 10
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def read_inputs(filename):
+    """Inputs of a file written by InputWriter, in the order in which they were written"""
+    with open(filename) as f:
+        return f.read().splitlines()
+
+
+class InputWriter:
+    """Write inputs to a file, one per line, as soon as they are produced.
+
+    The file is flushed every `flush_every` inputs or `flush_interval` seconds, so the inputs produced so far
+    survive a crash and can already be read while generation continues.
+    """
+
+    def __init__(self, filename, flush_every=DEFAULT_FLUSH_EVERY, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.filename = filename
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._file = open(filename, 'w')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def write(self, inp):
+        self._file.write(inp + "\n")
+        self.count += 1
+        self._pending += 1
+
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_all(self, inputs):
+        for inp in inputs:
+            self.write(inp)
+
+    def flush(self):
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
@@ -1,47 +1,94 @@
-import csv
+import argparse
 import os
-import json
-from functools import reduce
-
-# total statements
-#apkjson = "/home/leon/HiWi/droidgram/orig/fork/droidgram-1/apks/com.mirkoo.apps.mislibros_231_apps.evozi.com.apk.json"
-apkjson = "/home/leon/HiWi/droidgram/orig/fork/droidgram-1/apks/com.ajaxmobiletech.pocketlibrary_16020002_apps.evozi.com.apk.json"
-with open(apkjson) as f:
-    d = json.load(f)
-    print("total statements: {}".format(len(d["allMethods"])))
-# covered statements
-
-cov_statements = set()
-#suffix = "model/com.mirkoo.apps.mislibros/coverage.txt"
-suffix = "model/com.ajaxmobiletech.pocketlibrary/coverage.txt"
-cwd = "/home/leon/HiWi/droidgram/orig/fork/droidgram-1/merge-input-dir"
-all_seed_dirs = [os.path.join(cwd, o) for o in os.listdir(cwd) 
-                    if os.path.isdir(os.path.join(cwd,o)) and o.startswith("seed")]
-all_coverage_files = sorted([os.path.join(d, suffix) for d in all_seed_dirs])
-
-
-# print(all_seed_dirs)
-# print(all_coverage_files)
-
-cov_by_run = []
-for f in all_coverage_files:
-    print("Processing {}".format(f))
-    with open(f, 'r') as csvfile:
-        reader = csv.reader(csvfile, delimiter=';')
-        run_cov = set()
-        for row in reader:
-            if row != []:
-                #print("row: {}".format(row))
-                run_cov.add(row[0])
-		#cov_statements.add(row[0])        
-        cov_by_run.append(run_cov)
-        cov_statements = cov_statements | run_cov	
-
-for i, s in enumerate(all_coverage_files):
-    print("Report for {}".format(s))
-    print("{} \t (# of covered statements)".format(len(cov_by_run[i])))
-    print("{} \t (# of exclusively covered statements)".format(len(cov_by_run[i] - reduce(lambda x,y: x|y, [other for j, other in enumerate(cov_by_run) if j!=i]))))
-
-print("\n\n{} \t (# Total combined unique covered statements)".format(len(cov_statements)))
-#print("total cov statements: {}".format(cov_statements))
-#print("size of set: {}".format(len(cov_statements)))
+
+from coverage_store import CoverageStore
+from run_coverage import RunCoverage, read_run, read_universe
+
+
+def coverage_files(seeds_dir, package):
+    """coverage.txt of each seed directory in `seeds_dir`, sorted"""
+    suffix = os.path.join("model", package, "coverage.txt")
+    all_seed_dirs = [os.path.join(seeds_dir, o) for o in os.listdir(seeds_dir)
+                     if os.path.isdir(os.path.join(seeds_dir, o)) and o.startswith("seed")]
+    return sorted([os.path.join(d, suffix) for d in all_seed_dirs])
+
+
+def read_coverage(apk_json, files):
+    statements = read_universe(apk_json)
+    universe_size = len(statements)
+    print("total statements: {}".format(universe_size))
+
+    runs = []
+    for f in files:
+        print("Processing {}".format(f))
+        runs.append(read_run(statements, f))
+
+    return RunCoverage.from_bitmaps(statements, files, runs, universe_size)
+
+
+def print_report(coverage):
+    covered = coverage.covered()
+    exclusive = coverage.exclusive()
+    new = coverage.new_coverage()
+
+    for (i, s) in enumerate(coverage.names):
+        print("Report for {}".format(s))
+        print("{} \t (# of covered statements)".format(covered[i]))
+        print("{} \t (# of exclusively covered statements)".format(exclusive[i]))
+        print("{} \t (# of statements not covered by the runs above)".format(new[i]))
+
+    print("\nOverlap (# of statements covered by both runs)")
+    overlap = coverage.overlap()
+    for (i, s) in enumerate(coverage.names):
+        print("{}\t{}".format("\t".join(str(count) for count in overlap[i]), s))
+
+    unknown = coverage.unknown_statements()
+    if unknown:
+        print("\n{} \t (# of covered statements which are not in allMethods)".format(len(unknown)))
+
+    print("\n\n{} \t (# Total combined unique covered statements)".format(coverage.union_count()))
+
+
+def print_selection(coverage, fraction):
+    total = coverage.union_count()
+    selection = coverage.select(fraction)
+
+    print("\nRuns ranked by marginal coverage gain")
+    for (rank, step) in enumerate(coverage.greedy_selection()):
+        share = step.covered / max(total, 1)
+        print("{}\t+{}\t{}\t({:.2%})\t{}".format(rank + 1, step.gain, step.covered, share, coverage.names[step.run]))
+
+    print("\n{} of {} runs reach {:.0%} of the {} combined covered statements:".format(
+        len(selection), len(coverage), fraction, total))
+    for step in selection:
+        print(coverage.names[step.run])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the statements covered by the seeds of an exploration")
+    parser.add_argument("apk_json", nargs="?", help="instrumentation file of the app, <apk>.apk.json")
+    parser.add_argument("seeds_dir", nargs="?", help="directory with one seed* directory per run, e.g. merge-input-dir")
+    parser.add_argument("package", nargs="?",
+                        help="package name of the app, the coverage of a seed is in model/<package>/")
+    parser.add_argument("--store", default=None,
+                        help="read the coverage of the runs of --app from this coverage store (see ingest_coverage.py)")
+    parser.add_argument("--app", default=None, help="app whose runs are read from the coverage store")
+    parser.add_argument("--select", type=float, default=None, metavar="FRACTION",
+                        help="instead of the report, rank the runs by marginal coverage gain and list the fewest runs "
+                             "reaching this fraction of the combined coverage, e.g. 0.95")
+    args = parser.parse_args()
+
+    if args.store is not None:
+        if args.app is None:
+            parser.error("--store requires --app")
+        coverage = CoverageStore(args.store).read_coverage(args.app)
+        print("total statements: {}".format(coverage.universe_size))
+    elif args.package is None:
+        parser.error("expected the APK JSON, the seeds directory and the package, or --store and --app")
+    else:
+        coverage = read_coverage(args.apk_json, coverage_files(args.seeds_dir, args.package))
+
+    if args.select is None:
+        print_report(coverage)
+    else:
+        print_selection(coverage, args.select)
@@ -0,0 +1,104 @@
+import json
+
+from input_scheduling import replay_actions
+
+
+class _TrieNode:
+    __slots__ = ("children", "inputs")
+
+    def __init__(self):
+        self.children = {}
+        self.inputs = []
+
+
+class PrefixTrie:
+    """Prefix tree of the actions of a set of inputs. Inputs which start with the same actions share the path of
+    that prefix, a replay runner which can restore the state reached after a prefix only executes it once."""
+
+    def __init__(self, inputs=()):
+        self.root = _TrieNode()
+        self.num_inputs = 0
+        self.actions = 0
+        self.nodes = 0
+
+        for inp in inputs:
+            self.add(inp)
+
+    def add(self, inp):
+        """Add the next input, inputs are identified by the order in which they were added"""
+        node = self.root
+        actions = replay_actions(inp)
+
+        for action in actions:
+            child = node.children.get(action)
+            if child is None:
+                child = _TrieNode()
+                node.children[action] = child
+                self.nodes += 1
+            node = child
+
+        node.inputs.append(self.num_inputs)
+        self.num_inputs += 1
+        self.actions += len(actions)
+
+    @property
+    def saved_actions(self):
+        """Actions not executed when every shared prefix is replayed only once"""
+        return self.actions - self.nodes
+
+    def branch_points(self):
+        """Number of states from which more than one input continues (or where one ends and others continue)"""
+        count = 0
+        stack = [self.root]
+
+        while stack:
+            node = stack.pop()
+            if len(node.children) + (1 if node.inputs else 0) > 1:
+                count += 1
+            stack.extend(node.children.values())
+
+        return count
+
+    def plan(self):
+        """Replay plan: a tree of segments, each with the actions executed after restoring the state in which its
+        parent segment ended, the inputs which end with the segment and the segments which continue from it"""
+        root = {"actions": [], "inputs": self.root.inputs, "next": []}
+        stack = [(self.root, root)]
+
+        while stack:
+            node, segment = stack.pop()
+
+            for (action, child) in node.children.items():
+                # Chains without branches become a single segment
+                actions = [action]
+                while len(child.children) == 1 and not child.inputs:
+                    (action, child), = child.children.items()
+                    actions.append(action)
+
+                next_segment = {"actions": actions, "inputs": child.inputs, "next": []}
+                segment["next"].append(next_segment)
+                stack.append((child, next_segment))
+
+        return root
+
+    def summary(self):
+        return {
+            "inputs": self.num_inputs,
+            "actions": self.actions,
+            "plannedActions": self.nodes,
+            "savedActions": self.saved_actions,
+            "branchPoints": self.branch_points(),
+        }
+
+
+def write_replay_plan(filename, inputs):
+    """Write the replay plan of `inputs` (JSON), input numbers in the plan are their line numbers from 0.
+    Returns the PrefixTrie of the inputs."""
+    trie = PrefixTrie(inputs)
+    content = trie.summary()
+    content["plan"] = trie.plan()
+
+    with open(filename, 'w') as f:
+        json.dump(content, f)
+
+    return trie
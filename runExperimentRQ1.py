@@ -3,12 +3,15 @@ import os
 import signal
 import subprocess
 import shutil
-import time
 import multiprocessing
 from os import listdir
 from os.path import isfile, join
 from joblib import Parallel, delayed
 
+from emulator_readiness import DEFAULT_BOOT_TIMEOUT, EmulatorReadiness
+from grammar_terminal_inputs import generate_experiments_inputs, input_file, minimized_input_file
+from input_scheduling import GENERATION_ORDER
+
 emulator_port = 5554
 logback_config = """<?xml version="1.0" encoding="UTF-8"?>
 <configuration>
@@ -75,8 +78,19 @@ class Data():
         self.root_grammar_input_dir = "./input"
         self.root_apks_dir = "./apks"
         self.root_output_dir = "./output"
+        # Input sets generated for a grammar are reused while the grammar does not change
+        self.root_input_cache_dir = "./cache/inputs"
+        # GenerationBudget of each input set, None to generate until the grammar is covered
+        self.input_budget = None
+        # Replay the minimized suite of each seed (same coverage, fewer inputs) instead of all its inputs
+        self.minimize_inputs = False
+        # Order of the inputs of each seed and number of shard files written per seed, see input_scheduling.py
+        self.input_order = GENERATION_ORDER
+        self.input_shards = 1
         self.action_limit = 500
         self.nr_seeds = 10
+        # Seconds an emulator may take to boot before its item fails
+        self.boot_timeout = DEFAULT_BOOT_TIMEOUT
 
         self.apk = apk
         self.json = get_json_from_apk(apk)
@@ -85,6 +99,7 @@ class Data():
         self.avd_name = "emulator%d" % self.emulator_port
 
         self.emulator_pid = 0
+        self.readiness = None
 
         if seed is None:
             self.grammar_input_dir = join(self.root_grammar_input_dir, self.avd_name)
@@ -281,17 +296,18 @@ class Data():
         self._run_droidgram_extraction()
 
     def _step3_fuzz_grammar(self):
-        command = ["python3 "
-                   "grammar_terminal_inputs.py %s %s %d " % (self.root_grammar_input_dir,
-                                                             self.avd_name,
-                                                             self.nr_seeds,
-                                                             )
-                   ]
-        self._run_command(command, None)
+        print("Generating %d input sets from %s" % (self.nr_seeds, self.grammar_input_dir))
+        # Same stages as grammar_terminal_inputs.py: replay plan, coverage map, minimized suite, order and shards.
+        # Raises if a seed failed, so the experiment never runs on a partial set of seeds.
+        generate_experiments_inputs(self.root_grammar_input_dir, self.avd_name, self.nr_seeds,
+                                    cache_dir=self.root_input_cache_dir, budget=self.input_budget, minimize=True,
+                                    order=self.input_order, shards=self.input_shards)
 
         seeds = []
         print("processing dir %s" % self.grammar_input_dir)
-        files = [join(self.grammar_input_dir, f) for f in os.listdir(self.grammar_input_dir)]
+        # Only the input files of the seeds generated above, not leftovers of an earlier run
+        files = [input_file(self.root_grammar_input_dir, self.avd_name, seed_nr)
+                 for seed_nr in range(self.nr_seeds)]
         print("found files %s" % str(files))
         for file in files:
             if isfile(file) and os.path.basename(file).startswith("inputs") and file.endswith(".txt"):
@@ -304,7 +320,12 @@ class Data():
                     os.mkdir(seed_dir)
                 except:
                     pass
-                shutil.copy(file, seed_dir)
+                minimized_file = minimized_input_file(self.root_grammar_input_dir, self.avd_name, seed_nr)
+                if self.minimize_inputs and isfile(minimized_file):
+                    print("using minimized inputs %s" % minimized_file)
+                    shutil.copy(minimized_file, join(seed_dir, os.path.basename(file)))
+                else:
+                    shutil.copy(file, seed_dir)
                 shutil.copy(join(self.grammar_input_dir, "grammar.txt"), seed_dir)
                 shutil.copy(join(self.grammar_input_dir, "translationTable.txt"), seed_dir)
                 print("copying output folder from %s to %s" % (join(self.grammar_input_dir, "droidMate"), join(seed_dir, "droidMate")))
@@ -321,18 +342,13 @@ class Data():
         for seed in seeds:
             seed.start()
 
-        print("Waiting 30 seconds for all emulators to start")
-        time.sleep(10)
-        print("Waiting 20 seconds for all emulators to start")
-        time.sleep(10)
-        print("Waiting 10 seconds for all emulators to start")
-        time.sleep(10)
-        print("Assuming that ALL emulators have started proceeding")
-
+        # Each seed runs as soon as its own emulator has booted
         num_cores = multiprocessing.cpu_count()
         Parallel(n_jobs=num_cores)(delayed(run_step4)(item) for item in seeds)
 
     def step4_run_grammar_inputs(self):
+        self.wait_until_ready()
+
         log_name = "%s-04run" % self.avd_name
         self._write_logback_config_files(log_name)
         command = ["./04.sh %s %s %s %s %s " % ("%s.xml" % log_name,
@@ -345,10 +361,20 @@ class Data():
         self._run_command(command, None)
 
     def start(self):
+        """Create the AVD and boot its emulator without waiting for it. Return the EmulatorReadiness of the
+        emulator, also kept in `readiness`."""
         self._create_avd()
         self._start_emulator()
+        self.readiness = EmulatorReadiness(self.emulator_name, self.boot_timeout)
+
+        return self.readiness
+
+    def wait_until_ready(self):
+        if self.readiness is not None:
+            self.readiness.wait()
 
     def execute(self):
+        self.wait_until_ready()
         self._step1_run_exploration()
         self._step2_extract_grammar()
         self._step3_fuzz_grammar()
@@ -381,18 +407,10 @@ if __name__ == "__main__":
 
     data = init_all_experiments(apk_list)
 
+    # Each item waits for its own emulator to boot before it runs
     for item in data:
         item.start()
 
-    print("Waiting 30 seconds for all emulators to start")
-    time.sleep(10)
-    print("Waiting 20 seconds for all emulators to start")
-    time.sleep(10)
-    print("Waiting 10 seconds for all emulators to start")
-    time.sleep(10)
-    print("Assuming that ALL emulators have started proceeding")
-
-
     num_cores = multiprocessing.cpu_count()
     pool = multiprocessing.Pool(processes=num_cores)
 
@@ -0,0 +1,56 @@
+import hashlib
+import os
+import pickle
+
+# Increase when a change to eval.py alters the runs read from the summary files, so old entries are not reused
+CACHE_VERSION = 1
+
+
+def file_stamps(files):
+    """Name, modification time and size of each file of `files`, in order"""
+    stamps = []
+    for filename in files:
+        stat = os.stat(filename)
+        stamps.append((filename, stat.st_mtime_ns, stat.st_size))
+
+    return stamps
+
+
+class RunCache:
+    """Store of the runs read for each app directory.
+
+    Every entry is kept in `cache_dir` together with the stamps (see file_stamps) of the files it was read from and
+    is only returned while they are unchanged. The stamps are taken before the files are read, so a file modified
+    while it is read is read again next time.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _filename(self, app_dir):
+        key = "%s|%d" % (os.path.abspath(app_dir), CACHE_VERSION)
+        key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + ".pickle")
+
+    def load(self, app_dir, stamps):
+        """Return the entry of `app_dir`, or None if there is none or it was read from other files"""
+        try:
+            with open(self._filename(app_dir), 'rb') as f:
+                (entry_stamps, value) = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if entry_stamps != stamps:
+            return None
+
+        return value
+
+    def store(self, app_dir, stamps, value):
+        filename = self._filename(app_dir)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        # Write to a temporary file first, concurrent readers never see a partial entry
+        tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump((stamps, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
@@ -0,0 +1,168 @@
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from coverage_set import KeyIds
+from statement_index import statement_ids
+
+# Run picked by greedy_selection, the statements it adds to the runs picked before it and the statements covered by
+# all runs picked so far
+Selection = namedtuple("Selection", ["run", "gain", "covered"])
+
+# Lines of a coverage.txt file converted to statement IDs at a time
+READ_BATCH = 1 << 16
+
+# Number of bits set in each byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bitmaps):
+    """Number of bits set in each bitmap, along the last axis of `bitmaps`"""
+    return POPCOUNT[bitmaps].sum(axis=-1, dtype=np.int64)
+
+
+def read_universe(apk_json):
+    """KeyIds of the statements of the app, in the order of `allMethods` in its instrumentation file"""
+    return KeyIds(statement_ids(apk_json))
+
+
+def read_statements(coverage_file):
+    """Statements reached in a coverage.txt file, the part of each line before the first ';'"""
+    with open(coverage_file) as f:
+        for line in f:
+            statement = line.split(";", 1)[0].strip()
+            if statement:
+                yield statement
+
+
+def read_run(statements, coverage_file, batch_size=READ_BATCH):
+    """Packed bitmap of the statements reached in `coverage_file`, over the IDs of the KeyIds `statements`.
+
+    The file is streamed in batches of `batch_size` lines, so besides the bitmap only the IDs of one batch are kept
+    in memory. Statements which are not part of the universe yet get new IDs, the bitmap grows with them.
+    """
+    return read_run_files(statements, [coverage_file], batch_size)
+
+
+def read_run_files(statements, coverage_files, batch_size=READ_BATCH):
+    """Same as read_run, for a run whose reached statements are split over several files"""
+    bits = np.zeros(len(statements), dtype=bool)
+    ids = map(statements.id, itertools.chain.from_iterable(map(read_statements, coverage_files)))
+
+    while True:
+        batch = np.fromiter(itertools.islice(ids, batch_size), dtype=np.int64)
+        if len(batch) == 0:
+            return np.packbits(bits)
+
+        if len(statements) > len(bits):
+            bits = np.concatenate([bits, np.zeros(len(statements) - len(bits), dtype=bool)])
+        bits[batch] = True
+
+
+class RunCoverage:
+    """Statements covered by each of a set of runs, stored as one packed bitmap per run.
+
+    Bit `i` of a bitmap is the statement with ID `i` in the KeyIds `statements`, whose first `universe_size` IDs are
+    the statements of the app. Each analysis is one vectorized pass over the bitmaps of all runs.
+    """
+
+    def __init__(self, statements, names, bitmaps, universe_size):
+        self.statements = statements
+        self.names = names
+        self.bitmaps = bitmaps
+        self.universe_size = universe_size
+
+    @classmethod
+    def from_bitmaps(cls, statements, names, runs, universe_size):
+        """Coverage of the runs named `names`, where `runs` holds the bitmap returned by read_run for each run.
+        Bitmaps read before later runs added statements are shorter, they are padded with zeros."""
+        bitmaps = np.zeros((len(runs), (len(statements) + 7) // 8), dtype=np.uint8)
+
+        for (i, bitmap) in enumerate(runs):
+            bitmaps[i, :len(bitmap)] = bitmap
+
+        return cls(statements, list(names), bitmaps, universe_size)
+
+    def __len__(self):
+        return len(self.names)
+
+    def unknown_statements(self):
+        """Statements reached by the runs which are not statements of the app"""
+        return self.statements.keys[self.universe_size:]
+
+    def union(self):
+        return np.bitwise_or.reduce(self.bitmaps, axis=0)
+
+    def union_count(self):
+        return int(popcount(self.union()))
+
+    def covered(self):
+        """Number of statements covered by each run"""
+        return popcount(self.bitmaps)
+
+    def _others(self):
+        """Union of all other runs, for each run"""
+        others = np.zeros_like(self.bitmaps)
+        if len(self) > 1:
+            before = np.bitwise_or.accumulate(self.bitmaps, axis=0)
+            after = np.bitwise_or.accumulate(self.bitmaps[::-1], axis=0)[::-1]
+            others[1:] |= before[:-1]
+            others[:-1] |= after[1:]
+
+        return others
+
+    def exclusive(self):
+        """Number of statements covered by each run and no other run, the gain of adding it to all other runs"""
+        return popcount(self.bitmaps & ~self._others())
+
+    def new_coverage(self):
+        """Number of statements covered by each run and none of the runs before it"""
+        before = np.zeros_like(self.bitmaps)
+        if len(self) > 1:
+            before[1:] = np.bitwise_or.accumulate(self.bitmaps, axis=0)[:-1]
+
+        return popcount(self.bitmaps & ~before)
+
+    def marginal_gain(self, base):
+        """Number of statements each run adds to the bitmap `base`"""
+        return popcount(self.bitmaps & ~base)
+
+    def overlap(self):
+        """Number of statements covered by both runs, for each pair of runs"""
+        return popcount(self.bitmaps[:, None, :] & self.bitmaps[None, :, :])
+
+    def greedy_selection(self):
+        """All runs, each one adding the most statements to the runs before it. Ties go to the run listed first.
+
+        Every step computes the gain of all remaining runs in one pass; the Selection of each step is returned.
+        """
+        selection = []
+        base = np.zeros(self.bitmaps.shape[1:], dtype=np.uint8)
+        remaining = np.ones(len(self), dtype=bool)
+        covered = 0
+
+        for _ in range(len(self)):
+            gains = np.where(remaining, self.marginal_gain(base), -1)
+            run = int(np.argmax(gains))
+            remaining[run] = False
+            base |= self.bitmaps[run]
+            covered += int(gains[run])
+            selection.append(Selection(run, int(gains[run]), covered))
+
+        return selection
+
+    def select(self, fraction):
+        """Shortest prefix of the greedy selection covering at least `fraction` of the statements covered by all
+        runs"""
+        total = self.union_count()
+        selection = []
+        covered = 0
+
+        for step in self.greedy_selection():
+            if total == 0 or covered / total >= fraction:
+                break
+            selection.append(step)
+            covered = step.covered
+
+        return selection
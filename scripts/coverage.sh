@@ -1,26 +1,5 @@
-echo "Grammar" && \
-tail -n 1 seed0/grammarCoverage.txt && \
-tail -n 1 seed1/grammarCoverage.txt && \
-tail -n 1 seed2/grammarCoverage.txt && \
-tail -n 1 seed2/grammarCoverage.txt && \
-tail -n 1 seed3/grammarCoverage.txt && \
-tail -n 1 seed4/grammarCoverage.txt && \
-tail -n 1 seed5/grammarCoverage.txt && \
-tail -n 1 seed6/grammarCoverage.txt && \
-tail -n 1 seed7/grammarCoverage.txt && \
-tail -n 1 seed8/grammarCoverage.txt && \
-tail -n 1 seed9/grammarCoverage.txt && \
-tail -n 1 seed10/grammarCoverage.txt && \ 
-echo "Code" && \
-tail -n 1 seed0/codeCoverage.txt && \
-tail -n 1 seed1/codeCoverage.txt && \
-tail -n 1 seed2/codeCoverage.txt && \
-tail -n 1 seed2/codeCoverage.txt && \
-tail -n 1 seed3/codeCoverage.txt && \
-tail -n 1 seed4/codeCoverage.txt && \
-tail -n 1 seed5/codeCoverage.txt && \ 
-tail -n 1 seed6/codeCoverage.txt && \
-tail -n 1 seed7/codeCoverage.txt && \
-tail -n 1 seed8/codeCoverage.txt && \
-tail -n 1 seed9/codeCoverage.txt && \
-tail -n 1 seed10/codeCoverage.txt
+#!/usr/bin/env bash
+
+# Grammar and code coverage of each seed directory of the given directory (default: the current one).
+# Further arguments, e.g. --package <package>, are passed on to coverage_summary.py
+python3 "$(dirname "$0")/../coverage_summary.py" "${1:-.}" "${@:2}"
@@ -0,0 +1,162 @@
+import json
+import os
+import re
+
+CHUNK_SIZE = 1 << 20
+
+# Strings (possibly cut at the end of the buffer), structural characters and other scalars of a JSON document, with
+# the whitespace in front of them. Every character but trailing whitespace belongs to a token, so the tokens of a
+# buffer are contiguous.
+TOKENS = re.compile(r'\s*(?:"(?:[^"\\]|\\.)*(?:"|\\?\Z)|[{}\[\],:]|[^\s"{}\[\],:]+)')
+
+
+def iter_tokens(f, chunk_size=CHUNK_SIZE):
+    """Tokens of the JSON document in `f`, reading `chunk_size` characters at a time. Tokens keep their leading
+    whitespace and strings are not decoded."""
+    buffer = ""
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        tokens = TOKENS.findall(buffer)
+
+        if chunk and tokens:
+            # The last token may continue in the next chunk
+            tokens.pop()
+        yield from tokens
+
+        if not chunk:
+            return
+        buffer = buffer[sum(map(len, tokens)):]
+
+
+def iter_members(f, key):
+    """Members of the collection stored under the top level `key` of the JSON document in `f`: the keys of an object,
+    still JSON encoded, or the positions of the elements of an array.
+
+    Only keys and structural characters are kept while scanning, so the document is never built in memory. Reading
+    stops at the end of the collection.
+    """
+    expected_key = '"%s"' % key
+    depth = 0
+    top_level_key = False
+    found = False
+    target = None
+    is_object = False
+    expect_member = False
+    count = 0
+
+    for token in iter_tokens(f):
+        kind = token[-1]
+
+        if kind in "{[":
+            if depth == target and expect_member:
+                yield count
+                count += 1
+                expect_member = False
+            depth += 1
+            if found and target is None:
+                target = depth
+                is_object = kind == "{"
+                expect_member = True
+            top_level_key = depth == 1 and kind == "{"
+        elif kind in "}]":
+            if depth == target:
+                return
+            depth -= 1
+        elif kind == ",":
+            if depth == target:
+                expect_member = True
+            top_level_key = depth == 1
+        elif kind == ":":
+            continue
+        elif depth == target and expect_member:
+            if is_object:
+                yield token.lstrip()
+            else:
+                yield count
+                count += 1
+            expect_member = False
+        elif depth == 1 and top_level_key:
+            found = token.lstrip() == expected_key
+            top_level_key = False
+        elif found and target is None:
+            raise ValueError("%s is not a collection" % key)
+
+    raise KeyError(key)
+
+
+def count_members(f, key):
+    """Number of members of the collection stored under the top level `key` of the JSON document in `f`. As with
+    json.load, repeated keys of an object count once."""
+    return len(set(iter_members(f, key)))
+
+
+def statement_ids(apk_json):
+    """IDs of the statements of the app, the keys of `allMethods` in its instrumentation file, in file order"""
+    with open(apk_json, 'rt', encoding="utf-8") as f:
+        return [json.loads(member) for member in iter_members(f, "allMethods")]
+
+
+def count_statements(apk_json):
+    """Number of statements of the app, the entries of `allMethods` in its instrumentation file"""
+    with open(apk_json, 'rt', encoding="utf-8") as f:
+        return count_members(f, "allMethods")
+
+
+class StatementIndex:
+    """Persistent index of the number of statements of APK instrumentation files.
+
+    Entries are keyed by the absolute path of the file and only used while its modification time and size are
+    unchanged, otherwise the file is counted again.
+    """
+
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self.changed = False
+
+        try:
+            with open(index_file) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def count(self, apk_json):
+        path = os.path.abspath(apk_json)
+        stat = os.stat(path)
+
+        entry = self.entries.get(path)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["statements"]
+
+        statements = count_statements(path)
+        self.entries[path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "statements": statements}
+        self.changed = True
+
+        return statements
+
+    def entries_of(self, apk_json):
+        """Entry of `apk_json`, to be passed to `update` of the index this one was copied from"""
+        path = os.path.abspath(apk_json)
+        return {path: self.entries[path]}
+
+    def update(self, entries):
+        """Add the entries of a copy of the index, e.g. of a worker process"""
+        for (path, entry) in entries.items():
+            if self.entries.get(path) != entry:
+                self.entries[path] = entry
+                self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+
+        index_dir = os.path.dirname(self.index_file)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+
+        # Write to a temporary file first, an interrupted run never leaves a partial index
+        tmp_filename = "%s.%d.tmp" % (self.index_file, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_filename, self.index_file)
+        self.changed = False
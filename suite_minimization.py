@@ -0,0 +1,42 @@
+import heapq
+
+from coverage_set import KeyIds, bit_count
+
+
+def minimize_suite(coverage):
+    """Indices of a small subset of inputs which covers everything that all inputs cover, in their original order.
+
+    `coverage[i]` are the elements covered by input i. The subset is chosen by lazy greedy set cover: the input
+    which covers most still uncovered elements is selected first. Gains only shrink as elements get covered, so a
+    gain is only recomputed when its input reaches the top of the heap.
+    """
+    key_ids = KeyIds()
+    masks = [key_ids.mask(keys) for keys in coverage]
+
+    uncovered = 0
+    for mask in masks:
+        uncovered |= mask
+
+    heap = [(-bit_count(mask), i) for (i, mask) in enumerate(masks) if mask]
+    heapq.heapify(heap)
+    selected = []
+
+    while uncovered and heap:
+        _, i = heapq.heappop(heap)
+        gain = bit_count(masks[i] & uncovered)
+        if gain == 0:
+            continue
+
+        if heap and gain < -heap[0][0]:
+            # Another input may now cover more, check it first
+            heapq.heappush(heap, (-gain, i))
+            continue
+
+        selected.append(i)
+        uncovered &= ~masks[i]
+
+    return sorted(selected)
+
+
+def minimize_inputs(inputs, coverage):
+    return [inputs[i] for i in minimize_suite(coverage)]
@@ -0,0 +1,33 @@
+import unittest
+
+from input_scheduling import LONGEST_FIRST, SHORTEST_FIRST, action_count, order_inputs, shard_inputs
+
+
+class InputSchedulingTest(unittest.TestCase):
+    def test_action_count(self):
+        self.assertEqual(action_count("ClickEvent(w00) w01.LongClickEvent"), 2)
+        self.assertEqual(action_count("<start> <s01> <ClickEvent(s01.w00)> <s02> <PressBack(s02)> <empty>"), 2)
+
+    def test_order_inputs(self):
+        inputs = ["<s01> <ClickEvent(s01.w00)> <s02>",
+                  "<s01> <ClickEvent(s01.w00)> <s02> <ClickEvent(s02.w01)> <s03>",
+                  "<s01>"]
+
+        self.assertEqual(order_inputs(inputs, LONGEST_FIRST), [1, 0, 2])
+        self.assertEqual(order_inputs(inputs, SHORTEST_FIRST), [2, 0, 1])
+
+    def test_shards_balance_actions(self):
+        inputs = ["a(w0) b(w1) c(w2) d(w3)", "a(w0) b(w1)", "a(w0) b(w1)", "a(w0)", "a(w0)"]
+        shards = shard_inputs(inputs, 2)
+
+        loads = [sum(action_count(inputs[i]) for i in shard) for shard in shards]
+        self.assertEqual(sorted(loads), [5, 5])
+
+    def test_shards_without_actions_are_not_empty(self):
+        inputs = ["<s01> <s02>"] * 5
+
+        self.assertEqual(shard_inputs(inputs, 3), [[0, 3], [1, 4], [2]])
+
+
+if __name__ == "__main__":
+    unittest.main()